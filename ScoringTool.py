@@ -1,7 +1,16 @@
 #Load packages
-import pandas as pd
 import streamlit as st
 import math
+import os
+from columnregistry import registry
+from display import filter_controls, page_controls, page_table, top_results_control
+from filters import filter_key, filter_rows
+from navhistory import HISTORY_FILE, load_history, with_history_updates
+from pipeline import Pipeline
+from prefetch import prefetcher
+from scoremodel import no_tickbox_columns, consistency_windows, result_cache, score_columns_for, score_vector, shared_score_table, sort_rows
+from timing import StageTimer
+from vctdata import DATABASE_FILE, SCORING_SHEET, load_dataset
 
 # Set the title and introduction of the application
 st.title("VCT Scoring Tool")
@@ -10,51 +19,47 @@ st.write("Welcome to the VCT Scoring tool! This application allows you to discov
 	" Customize the table by selecting parameters of interest and setting their relative importance to you to calculate the VCT scores."
 	" The score will help you identify VCTs that best suit your investment needs.")
 
-################ Define column lists - edit here if columns changed in source spreadsheet ##########################################
+# Time each stage of this rerun, see timing.py
+timer = StageTimer("ScoringTool")
 
-# Load the data from the specified Excel file and sheet using pandas
-df = pd.read_excel("VCT Database.xlsm", sheet_name="Streamlit", engine="openpyxl")
+################ Load data - the column lists are defined in scoremodel.py, edit there if columns changed in source spreadsheet ####
 
-no_tickbox_columns = ["VCT"]
+# Load the data from the specified Excel file and sheet (parsed once and reused until the workbook changes)
+# The column statistics used for scoring are precomputed when the data is loaded
+# NAVs and dividends added to the NAV history since the workbook was last edited update the VCTs they are for
+dataset = with_history_updates(load_dataset(DATABASE_FILE, SCORING_SHEET))
+df = dataset.frame
 
-non_numeric_columns = ["VCT", "Management Group", "AIC Sector", "TIDM", "Date of last results"]
-performance_columns = ["NAV tr 1 yr", "NAV tr 5 yr", "NAV tr 10 yr"]
-consistency_columns = ["0 to 12 m", "12 to 24 m", "24 to 36 m"]
-diversification_columns = ["Top 5 Weight", "Top 10 Weight", "Equivalent Equal Sized"]
-analytics_columns = ["Net Assets", "Discount", "Dividend Yield", "Charge (w/o perf fee)", "Charge (w/ perf fee)", "Net Cash"]
+# Each session keeps its own pipeline so that a widget change only reruns the stages that depend on it
+# The pipeline only holds per-row vectors (scores and row positions), the tables themselves are shared by every session
+if "pipeline" not in st.session_state:
+	st.session_state["pipeline"] = Pipeline()
+pipeline = st.session_state["pipeline"]
+timer.lap("load")
 
-bad_columns = ["Top 5 Weight", "Top 10 Weight", "Discount", "Charge (w/o perf fee)", "Charge (w/ perf fee)", "Net Cash"]
-date_columns = ["Date of last results"]
-
-no_of_basic = len(non_numeric_columns) - 1
-no_of_performance = len(performance_columns)
-no_of_consistency = len(consistency_columns)
-no_of_diversification = len(diversification_columns)
-no_of_analytics = len(analytics_columns)
+# The sheet's columns in their tickbox groups, looked up in the column registry once per dataset
+column_groups = dataset.derived(("column_groups",), lambda: registry.grouped(df.columns))
 
 ###################################################################################################################################
 
 # Initialize the list of selected columns with the default non-tickbox columns
 selected_columns = no_tickbox_columns.copy()
 
-# Create a new vector of columns for the "Column Selection" section
-tickbox_columns = [col for col in df.columns if col not in no_tickbox_columns]
-
 # Create an expander for column selection
 column_expander = st.expander("Select the parameters you wish to include in the table here:")
 
 # Function to create tickboxes for parameter selection
-def tickboxes(name, start_column, end_column):
+def tickboxes(name, group_columns):
 	column_expander.write(name)
 	num_columns = 3
-	num_rows = math.ceil(end_column / num_columns)
+	num_rows = math.ceil(len(group_columns) / num_columns)
 	columns_per_row = num_columns
 	
 	cols = []
 	for _ in range(num_rows):
 		cols.append(column_expander.columns(columns_per_row))
 		
-	for i, column in enumerate(tickbox_columns[start_column:(start_column + end_column)]):
+	for i, column in enumerate(group_columns):
 		row = i // columns_per_row
 		col = i % columns_per_row
 		checkbox = cols[row][col].checkbox(column, value=True, key=f"checkbox_{column}")
@@ -62,80 +67,31 @@ def tickboxes(name, start_column, end_column):
 			selected_columns.append(column)
 
 # Include tickboxes for parameter selection in the application
-tickboxes("Basic Information", 0, no_of_basic)
-tickboxes("Performance (Items to be included in the Performance Score)", no_of_basic, no_of_performance)
+tickboxes("Basic Information", column_groups["Basic Information"])
+tickboxes("Performance (Items to be included in the Performance Score)", column_groups["Performance"])
 column_expander.write("Performance Consistency")
 col1, col2 = column_expander.columns(2)
 checkbox = col1.checkbox("5 year Performance Consistency Ranking", value=True)
+windows = None
 if checkbox:
-	selected_columns.extend(consistency_columns)
-tickboxes("Diversification (Items to be included in the Diversification Score)", (no_of_basic + no_of_performance + no_of_consistency), no_of_diversification)
-tickboxes("Analytics", (no_of_basic + no_of_performance + no_of_consistency + no_of_diversification), no_of_analytics)
-
-# Create a new DataFrame with the selected columns only
-filtered_df = df[selected_columns]
-
-# Function to check if two vectors contain any similar elements
-def contains_similar_element(vector_1, vector_2):
-	for element in vector_2:
-		if element in vector_1:
-			return True
-	return False
-	
-# Calculate diversification score if any diversification columns are selected
-score_columns = [col for col in selected_columns if col in analytics_columns]
-
-if contains_similar_element(diversification_columns, selected_columns):
-	common_columns = list(set(diversification_columns) & set(selected_columns))
-	normalized_common = pd.DataFrame()
-	for i, col in enumerate(common_columns):
-		if col in bad_columns:
-			normalized_common[i] = (1-(filtered_df[col] - filtered_df[col].min()) / (
-				filtered_df[col].max() - filtered_df[col].min()))
-		else:
-			normalized_common[i] = (filtered_df[col] - filtered_df[col].min()) / (
-				filtered_df[col].max() - filtered_df[col].min())
-	div_scores = 10 * normalized_common.mean(axis=1)
-	for i, col in enumerate(filtered_df):
-		if col in diversification_columns:
-			diversification_column_index = i
-	filtered_df.insert(diversification_column_index + 1, "Diversification Score", div_scores.round(2))
-	
-	score_columns = ["Diversification Score"] + score_columns
-
-# Calculate performance consistency rank if any consistency columns are selected
-if contains_similar_element(consistency_columns, selected_columns):
-	common_columns = list(set(consistency_columns) & set(selected_columns))
-	filtered_df[common_columns] = filtered_df[common_columns].round(3)
-	rank_df = filtered_df[common_columns].rank(axis=0, method='first', ascending=False)
-	for i, col in enumerate(filtered_df):
-		if col in consistency_columns:
-			consistency_column_index = i
-	filtered_df.insert(consistency_column_index + 1, "Performance Consistency Rank", rank_df.mean(axis=1).round(2))
-	filtered_df = filtered_df.drop(columns=set(consistency_columns))
-	bad_columns = ["Performance Consistency Rank"] + bad_columns
-	
-	score_columns = ["Performance Consistency Rank"] + score_columns
-
-# Calculate performance score if any performance columns are selected
-if contains_similar_element(performance_columns, selected_columns):
-	common_columns = list(set(performance_columns) & set(selected_columns))
-	normalized_common = pd.DataFrame()
-	for i, col in enumerate(common_columns):
-		normalized_common[i] = (filtered_df[col] - filtered_df[col].min()) / (
-			filtered_df[col].max() - filtered_df[col].min())
-	perf_scores = 10 * normalized_common.mean(axis=1)
-	for i, col in enumerate(filtered_df):
-		if col in performance_columns:
-			performance_column_index = i
-	filtered_df.insert(performance_column_index + 1, "Performance Score", perf_scores.round(2))
-
-	score_columns = ["Performance Score"] + score_columns
-	
-# Convert date columns to day-month-year format
-for col in date_columns:
-	if col in filtered_df.columns:
-		filtered_df[col] = filtered_df[col].dt.strftime("%d-%m-%Y")
+	selected_columns.extend(column_groups["Performance Consistency"])
+	# The ranking can use the workbook's annual windows or any windows calculated from the NAV history, if it is present
+	consistency_window = col2.selectbox("Ranked over:", list(consistency_windows), key="consistency_windows")
+	windows = consistency_windows[consistency_window]
+	if windows is not None and not os.path.exists(HISTORY_FILE):
+		col2.caption(f"'{HISTORY_FILE}' was not found, so the workbook's annual windows are used")
+		windows = None
+history = load_history() if windows is not None else None
+tickboxes("Diversification (Items to be included in the Diversification Score)", column_groups["Diversification"])
+tickboxes("Analytics", column_groups["Analytics"])
+timer.lap("tickboxes")
+
+# Calculate the sub-scores for the selected columns (shared with other sessions using the same selection)
+# and find the score columns (sub-scores and analytics) they produce
+score_view = shared_score_table(dataset, selected_columns, history, windows)
+score_columns = score_columns_for(selected_columns)
+weights = None
+timer.lap("sub-scores")
 
 # Calculate overall score based on the selected weights if any score columns are present
 if len(score_columns) != 0:
@@ -163,36 +119,13 @@ if len(score_columns) != 0:
 		weights.append(weight)
 		weight_counter += 1
 
-	# Calculate the weighted average score based on the selected weights
-
-	# Calculate the weighted sum and total weight for multiple numerical datapoints
-	weighted_sum = 0
-	total_weight = 0
-
-	for i, col in enumerate(score_columns):
-		if col in ["Performance Score", "Diversification Score"]:
-			weighted_sum += filtered_df[col] / 10 * weights[i]
-			total_weight += weights[i]
-		else:
-			normalized_column = (filtered_df[col] - filtered_df[col].min()) / (
-						filtered_df[col].max() - filtered_df[col].min())
-			if col in bad_columns:
-				weighted_sum += (1 - normalized_column) * weights[i]
-			else:
-				weighted_sum += normalized_column * weights[i]
-			total_weight += weights[i]
-
-	# Calculate the weighted average score
-	weighted_average = weighted_sum / total_weight
-
-	# Scale the weighted average to the range of 0 to 10
-	scaled_score = 0 + weighted_average * (10 - 0)
-
-	# Round the score to 2 decimal places
-	rounded_score = round(scaled_score, 2)
-
-	# Display the score
-	filtered_df["Score"] = rounded_score
+# Calculate the weighted score, only rerun when the weights or the selected columns change
+# Each stage's result is also kept in the result cache shared by every session, keyed on the canonical UI state it depends on
+# and the dataset version, so that going back to a recent configuration does not recompute it
+score_state = (dataset.version, tuple(selected_columns), tuple(weights or ()), None if history is None else (history.version, windows))
+score = pipeline.stage("score", lambda: result_cache.get(("score", score_state), lambda: score_vector(score_view, weights)),
+	inputs=score_state)
+timer.lap("weighted score")
 
 # Add a section for Sorting the Results
 st.subheader("Sort and Filter")
@@ -202,46 +135,75 @@ st.write("You can sort the displayed VCTs based on your chosen parameters. Selec
 
 # Remove unticked columns from the sort by dropdown options
 
-sort_columns = ["Score"] + list(filtered_df.columns[:-1]) if "Score" in filtered_df else list(filtered_df.columns)
+sort_columns = ["Score"] + score_view.columns if score is not None else score_view.columns
 
 sort_by = st.selectbox("Sort By:", sort_columns, key="sort_by")
 
-# Sort the DataFrame based on the selected column
-if sort_by in date_columns:
+# Choose the sort order for the selected column
+if registry.type_of.get(sort_by) == "date":
 	sort_order = st.radio("Sort Order", ["Earliest first", "Latest first"], index=0, key="sort_order")
 	ascending = True if sort_order == "Earliest first" else False
-	filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
-elif sort_by in non_numeric_columns:
+elif registry.type_of.get(sort_by) in ("text", "category"):
 	sort_order = st.radio("Sort Order", ["A - Z", "Z - A"], index=0, key="sort_order")
 	ascending = True if sort_order == "A - Z" else False
-	filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
 else:
 	sort_order = st.radio("Sort Order", ["Descending", "Ascending"], index=0, key="sort_order")
-	if "Score" in filtered_df and sort_by == "Score":
-		filtered_df = filtered_df.sort_values(by=sort_by, ascending=(sort_order == "Ascending"), ignore_index=True)
-	else:
-		ascending = sort_order == "Ascending"
-		filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
-
-# Format numerical values to remove trailing zeros
-for col in sort_columns:
-	filtered_df[col] = filtered_df[col].apply(lambda x: str(x).rstrip("0").rstrip(".") if isinstance(x, float) else x)
+	ascending = sort_order == "Ascending"
 
 # Add a filter by AIC Sector option if AIC Sector column is selected
 if "AIC Sector" in selected_columns:
 	st.write("Filter the results by AIC Sector to remove VCTs that are not relevant to your search.")
-	# Get unique AIC Sectors from the DataFrame
-	aic_sectors = df["AIC Sector"].unique()
+	# The AIC Sectors are indexed when the data is loaded
+	aic_sectors = dataset.indexes["AIC Sector"].categories
 	# Allow users to select multiple AIC Sectors to filter the data
 	selected_aic_sectors = st.multiselect("Filter by AIC Sector:", aic_sectors)
-	# Filter the DataFrame based on the selected AIC Sectors
-	if selected_aic_sectors:
-		filtered_df = filtered_df[filtered_df["AIC Sector"].isin(selected_aic_sectors)]
+else:
+	selected_aic_sectors = []
 
-# Reset the index to start from 1
-filtered_df.index = range(1, len(filtered_df) + 1)
+# Add a filter by Management Group from the same index if Management Group column is selected
+if "Management Group" in selected_columns:
+	selected_management_groups = st.multiselect("Filter by Management Group:", dataset.indexes["Management Group"].categories)
+else:
+	selected_management_groups = []
+
+# Add filters on any of the other selected columns: ranges of numbers and dates, or sets of values
+filter_expander = st.expander("Filter by other parameters here:")
+filter_by = filter_expander.multiselect("Filter by:", [col for col in selected_columns
+	if col in df.columns and col not in ["VCT", "AIC Sector", "Management Group"]], key="filter_by")
+ranges, categories = filter_controls(dataset, filter_by, filter_expander)
+categories["AIC Sector"] = selected_aic_sectors
+categories["Management Group"] = selected_management_groups
+
+# Keep the row positions passing every filter, each filter is a lookup in an index of its column
+filter_state = (dataset.version, filter_key(ranges, categories))
+filtered_rows = pipeline.stage("filter", lambda: result_cache.get(("filter", filter_state),
+	lambda: filter_rows(dataset, ranges, categories)), inputs=filter_state)
+timer.lap("filter")
+
+# When sorting by Score only the top VCTs are shown unless all of them are asked for
+top = top_results_control(len(filtered_rows)) if sort_by == "Score" else None
+
+# Sort the filtered row positions based on the selected column, only rerun when the sort, the filter or the scores change
+# The top VCTs by Score are picked without sorting the rest
+sort_state = (score_state, filter_state, sort_by, ascending, top)
+visible_rows = pipeline.stage("sort", lambda: result_cache.get(("sort", sort_state),
+	lambda: sort_rows(score_view, score, filtered_rows, sort_by, ascending, top)), inputs=(sort_by, ascending, top), after=("score", "filter"))
+timer.lap("sort")
 # Display the filtered DataFrame in a table format
 st.subheader("Table")
 st.write("View the table in full by selecting the arrows in the top right corner:")
 
-st.table(filtered_df)
+# Display the table a page at a time, building the rows of the current page from the shared columns, numbered from 1
+# This is the only place a table is assembled, dates and numerical values are only formatted (day-month-year, no trailing zeros) here
+page = page_controls(len(visible_rows))
+display_df = pipeline.stage("format", lambda: result_cache.get(("table", sort_state, page),
+	lambda: page_table(score_view, score, visible_rows, page, registry.precision)), inputs=(page,), after=("sort",))
+timer.lap("format")
+st.table(display_df)
+timer.lap("render")
+
+# Compute the tables for the neighbouring weights and the other sort order in the background, ready for the next interaction
+prefetcher.schedule(pipeline, score_view, score_state, filter_state, filtered_rows, sort_by, ascending, top, page)
+
+# Log the stage timings and show them in a debug panel when timing is enabled, with the result cache's and prefetcher's counts
+timer.report(caches={"results": result_cache, "prefetch": prefetcher})
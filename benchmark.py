@@ -0,0 +1,155 @@
+#Load packages
+import argparse
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import scoremodel
+from columnregistry import registry
+from display import TOP_RESULTS, format_table
+from filters import filter_mask
+from scoremodel import ScoreTable, score_vector
+from scoring import top_order, weighted_average
+from vctdata import DATABASE_FILE, PERFORMANCE_SHEET, SCORING_SHEET, Dataset, apply_column_types, clear_cache, load_dataset
+
+# Benchmark of the ScoringTool and performancedatabase pipeline stages
+# Times the load, sub-score (or average score), weighted score, sort, top results, filter, format and render stages against
+# both sheets of the bundled workbook and against synthetic VCT-like datasets, reporting the median time and the peak memory
+# allocated by each stage, render being the conversion of the formatted table into the Arrow payload st.table sends:
+#   python benchmark.py [--rows 10000 100000] [--extra-columns 200] [--output results.csv] [--compare baseline.csv]
+# With --compare the run fails if any stage is slower than the baseline by more than --tolerance times
+
+sectors = ["VCT Generalist", "VCT AIM Quoted", "VCT Specialist: Environmental", "VCT Specialist: Technology", "Other"]
+
+# Build a synthetic dataset with the scoring sheet's columns plus extra metric columns
+def synthetic_frame(rows, extra_columns=0, seed=0):
+	rng = np.random.default_rng(seed)
+	columns = {
+		"VCT": [f"VCT {i}" for i in range(rows)],
+		"Management Group": [f"Manager {i}" for i in rng.integers(0, max(1, rows // 5), rows)],
+		"AIC Sector": rng.choice(sectors, rows),
+		"TIDM": [f"T{i:06d}" for i in range(rows)],
+		"Date of last results": pd.Timestamp("2023-06-30") - pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+	}
+	metric_columns = (scoremodel.performance_columns + scoremodel.consistency_columns
+		+ scoremodel.diversification_columns + scoremodel.analytics_columns)
+	for col in metric_columns + [f"Metric {i}" for i in range(extra_columns)]:
+		columns[col] = np.round(rng.normal(10, 25, rows), 2)
+	return apply_column_types(pd.DataFrame(columns))
+
+# Keep the sorted row positions in the chosen AIC Sectors, as the applications do
+def filter_sectors(dataset, rows, chosen_sectors):
+	return rows[filter_mask(dataset, categories={"AIC Sector": chosen_sectors})[rows]]
+
+# Average Score of each row, as performancedatabase.py calculates it: the mean of the selected number columns
+def average_score(frame, selected_columns):
+	score_columns = [col for col in selected_columns if registry.type_of.get(col, "number") == "number"]
+	return frame[score_columns].mean(axis=1).round(2)
+
+# Bytes st.table sends to the browser for a formatted table, serialised as an Arrow IPC stream as Streamlit does
+def render_payload(table):
+	arrow_table = pa.Table.from_pandas(table)
+	sink = pa.BufferOutputStream()
+	with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+		writer.write_table(arrow_table)
+	return sink.getvalue().to_pybytes()
+
+# Run a stage repeatedly, returning its last result, median time in milliseconds and peak allocated memory in MB
+def measure(compute, repeats):
+	times = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		result = compute()
+		times.append((time.perf_counter() - start) * 1000)
+	tracemalloc.start()
+	compute()
+	peak = tracemalloc.get_traced_memory()[1] / 1e6
+	tracemalloc.stop()
+	return result, float(np.median(times)), peak
+
+# Results of a dataset's stages and the function that times a stage, records it and returns the stage's result
+def stage_recorder(name, repeats):
+	results = []
+	def record(stage, compute):
+		result, ms, peak = measure(compute, repeats)
+		results.append({"dataset": name, "stage": stage, "median_ms": round(ms, 3), "peak_mb": round(peak, 3)})
+		return result
+	return results, record
+
+# Time each ScoringTool pipeline stage for a dataset, load is the function that builds the Dataset
+def benchmark_dataset(name, load, repeats):
+	results, record = stage_recorder(name, repeats)
+
+	dataset = record("load", load)
+	selected_columns = [col for col in dataset.frame.columns if not col.startswith("Metric ")]
+	weights = [5] * len(scoremodel.score_columns_for(selected_columns))
+
+	view = record("sub-scores", lambda: ScoreTable(dataset, selected_columns))
+	score = record("weighted score", lambda: score_vector(view, weights))
+	metric_weights = np.linspace(1, 10, len(dataset.stats.columns))
+	record(f"weighted score ({len(metric_weights)} metrics)", lambda: weighted_average(dataset.stats.normalised, metric_weights))
+	rows = record("sort", lambda: top_order(score))
+	record(f"top {TOP_RESULTS}", lambda: top_order(score, TOP_RESULTS))
+	chosen_sectors = list(dataset.frame["AIC Sector"].unique()[:2])
+	rows = record("filter", lambda: filter_sectors(dataset, rows, chosen_sectors))
+	ranges = {"Net Assets": (0, None), "Charge (w/ perf fee)": (None, 30), "Date of last results": (pd.Timestamp("2022-01-01"), None)}
+	record("filter (4 fields)", lambda: filter_mask(dataset, ranges, {"AIC Sector": chosen_sectors}))
+	table = record("format", lambda: format_table(view.take(rows, score, index=range(1, len(rows) + 1)), registry.precision))
+	record("render", lambda: render_payload(table))
+	return results
+
+# Time each performancedatabase pipeline stage for a dataset, with every column ticked and sorted by Average Score
+def benchmark_performance(name, load, repeats):
+	results, record = stage_recorder(name, repeats)
+	dataset = record("load", load)
+	frame = dataset.frame
+	scores = record("average score", lambda: average_score(frame, list(frame.columns))).to_numpy()
+	rows = record("sort", lambda: top_order(scores))
+	record(f"top {TOP_RESULTS}", lambda: top_order(scores, TOP_RESULTS))
+	ordered = frame.assign(**{"Average Score": scores}).iloc[rows]
+	table = record("format", lambda: format_table(ordered.set_axis(range(1, len(rows) + 1)), registry.precision))
+	record("render", lambda: render_payload(table))
+	return results
+
+# Compare a run with a baseline, returning the stages slower than tolerance times their baseline
+def regressions(results, baseline, tolerance):
+	merged = results.merge(baseline, on=["dataset", "stage"], suffixes=("", "_baseline"))
+	return merged[merged["median_ms"] > merged["median_ms_baseline"] * tolerance]
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark the ScoringTool pipeline stages.")
+	parser.add_argument("--workbook", default=DATABASE_FILE, help="Excel workbook to benchmark")
+	parser.add_argument("--rows", type=int, nargs="*", default=[10000, 100000], help="Row counts of the synthetic datasets")
+	parser.add_argument("--extra-columns", type=int, default=200, help="Extra metric columns in the synthetic datasets")
+	parser.add_argument("--repeats", type=int, default=5, help="Times each stage is run, the median is reported")
+	parser.add_argument("--output", help="CSV file to write the results to")
+	parser.add_argument("--compare", help="CSV file of baseline results to check for regressions")
+	parser.add_argument("--tolerance", type=float, default=1.5, help="Allowed slowdown against the baseline")
+	args = parser.parse_args()
+
+	def workbook_loader(sheet):
+		def load_workbook():
+			clear_cache()
+			return load_dataset(args.workbook, sheet)
+		return load_workbook
+
+	results = benchmark_dataset(f"{args.workbook}: {SCORING_SHEET}", workbook_loader(SCORING_SHEET), args.repeats)
+	results += benchmark_performance(f"{args.workbook}: {PERFORMANCE_SHEET}", workbook_loader(PERFORMANCE_SHEET), args.repeats)
+	for rows in args.rows:
+		frame = synthetic_frame(rows, args.extra_columns)
+		name = f"synthetic {rows} x {frame.shape[1]}"
+		results += benchmark_dataset(name, lambda: Dataset(frame, "synthetic"), args.repeats)
+		results += benchmark_performance(f"{name} (performance)", lambda: Dataset(frame, "synthetic"), args.repeats)
+
+	results = pd.DataFrame(results)
+	print(results.to_string(index=False))
+	if args.output:
+		results.to_csv(args.output, index=False)
+	if args.compare:
+		slower = regressions(results, pd.read_csv(args.compare), args.tolerance)
+		if len(slower):
+			print(f"\nStages more than {args.tolerance} times slower than the baseline:")
+			print(slower[["dataset", "stage", "median_ms_baseline", "median_ms"]].to_string(index=False))
+			sys.exit(1)
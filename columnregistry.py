@@ -0,0 +1,111 @@
+#Load packages
+from collections import namedtuple
+
+# Registry of the VCT Database columns and the columns calculated from them
+# Every column is declared once with its group, type, direction, display precision and the score it counts towards,
+# and compiled into lookup tables when this module is first imported, so the applications look a column up rather than
+# scanning lists or slicing the sheet by position on every rerun:
+#   registry.group_of["Top 5 Weight"]  ->  "Diversification"
+#   registry.is_bad["Discount"]        ->  True
+
+################ Define the columns - edit here if columns are added to or changed in the source spreadsheet ######################
+
+# Column: the sheet column (or calculated column) name
+# Group: the tickbox group it is shown in, None if it is not ticked
+# Type: "text", "category", "date" or "number" for sheet columns, "score" (0 to 10) or "rank" for calculated ones
+# Direction: "good" if higher is better, "bad" if lower is better, None if it is not scored
+# Places: decimal places shown, None to show the value in full
+# Score: the sub-score the column counts towards, "Score" if it is weighted in the Score itself
+column_registry = [
+	# Column                           Group                        Type        Direction  Places  Score
+	("VCT",                            None,                        "text",     None,      None,   None),
+	("Management Group",               "Basic Information",         "text",     None,      None,   None),
+	("AIC Sector",                     "Basic Information",         "category", None,      None,   None),
+	("TIDM",                           "Basic Information",         "category", None,      None,   None),
+	("Date of last results",           "Basic Information",         "date",     None,      None,   None),
+	("NAV per share",                  "Performance",               "number",   "good",    2,      None),
+	("NAV tr 6 m",                     "Performance",               "number",   "good",    2,      None),
+	("NAV tr 1 yr",                    "Performance",               "number",   "good",    2,      "Performance Score"),
+	("NAV tr 3 yr",                    "Performance",               "number",   "good",    2,      None),
+	("NAV tr 5 yr",                    "Performance",               "number",   "good",    2,      "Performance Score"),
+	("NAV tr 10 yr",                   "Performance",               "number",   "good",    2,      "Performance Score"),
+	("0 to 12 m",                      "Performance Consistency",   "number",   "good",    2,      "Performance Consistency Rank"),
+	("12 to 24 m",                     "Performance Consistency",   "number",   "good",    2,      "Performance Consistency Rank"),
+	("24 to 36 m",                     "Performance Consistency",   "number",   "good",    2,      "Performance Consistency Rank"),
+	("SPTR 6 m",                       "Performance",               "number",   "good",    2,      None),
+	("SPTR 1 yr",                      "Performance",               "number",   "good",    2,      None),
+	("SPTR 3 yr",                      "Performance",               "number",   "good",    2,      None),
+	("SPTR 5 yr",                      "Performance",               "number",   "good",    2,      None),
+	("SPTR 10 yr",                     "Performance",               "number",   "good",    2,      None),
+	("Top 5 Weight",                   "Diversification",           "number",   "bad",     2,      "Diversification Score"),
+	("Top 10 Weight",                  "Diversification",           "number",   "bad",     2,      "Diversification Score"),
+	("Equivalent Equal Sized",         "Diversification",           "number",   "good",    2,      "Diversification Score"),
+	("Net Assets",                     "Analytics",                 "number",   "good",    2,      "Score"),
+	("Discount",                       "Analytics",                 "number",   "bad",     2,      "Score"),
+	("Dividend Yield",                 "Analytics",                 "number",   "good",    2,      "Score"),
+	("Charge (w/o perf fee)",          "Analytics",                 "number",   "bad",     2,      "Score"),
+	("Charge (w/ perf fee)",           "Analytics",                 "number",   "bad",     2,      "Score"),
+	("Net Cash",                       "Analytics",                 "number",   "bad",     2,      "Score"),
+	# Sub-scores, in the order their weights are shown
+	("Performance Score",              None,                        "score",    "good",    2,      "Score"),
+	("Performance Consistency Rank",   None,                        "rank",     "bad",     2,      "Score"),
+	("Diversification Score",          None,                        "score",    "good",    2,      "Score"),
+]
+
+###################################################################################################################################
+
+# One declared column
+Column = namedtuple("Column", ["name", "group", "type", "direction", "places", "score"])
+
+# The declared columns compiled into lookup tables
+# Groups, types and sub-scores list their columns in the order they are declared
+class ColumnRegistry:
+	def __init__(self, declarations):
+		self.columns = {}
+		self.groups = {}
+		self.types = {}
+		self.members = {}
+		for declaration in declarations:
+			column = Column(*declaration)
+			if column.name in self.columns:
+				raise ValueError(f"Column '{column.name}' is declared twice")
+			self.columns[column.name] = column
+			if column.group is not None:
+				self.groups.setdefault(column.group, []).append(column.name)
+			self.types.setdefault(column.type, []).append(column.name)
+			if column.score is not None:
+				self.members.setdefault(column.score, []).append(column.name)
+		unknown = [name for name in self.members if name != "Score" and name not in self.columns]
+		if unknown:
+			raise ValueError(f"Sub-scores are not declared as columns: {', '.join(unknown)}")
+
+		self.group_of = {name: column.group for name, column in self.columns.items()}
+		self.type_of = {name: column.type for name, column in self.columns.items()}
+		self.is_bad = {name: column.direction == "bad" for name, column in self.columns.items()}
+		self.score_of = {name: column.score for name, column in self.columns.items()}
+		self.precision = {name: column.places for name, column in self.columns.items() if column.places is not None}
+		# Sub-scores are the declared columns other columns count towards, in the order they are declared
+		self.sub_scores = [name for name in self.columns if name in self.members]
+
+	def __contains__(self, name):
+		return name in self.columns
+
+	# Columns of a table grouped for the tickboxes, in the table's order, as {group: [columns]}
+	# Columns that are not declared, or not ticked, are left out
+	def grouped(self, columns):
+		groups = {group: [] for group in self.groups}
+		for name in columns:
+			group = self.group_of.get(name)
+			if group is not None:
+				groups[group].append(name)
+		return groups
+
+	# Selected columns of each sub-score with at least one selected, as {sub-score: [columns in declared order]},
+	# the sub-scores in declared order
+	def selected_members(self, selected_columns):
+		selected = set(selected_columns)
+		return {sub_score: [name for name in self.members[sub_score] if name in selected]
+			for sub_score in self.sub_scores if not selected.isdisjoint(self.members[sub_score])}
+
+# The registry used by the applications, compiled once per process
+registry = ColumnRegistry(column_registry)
@@ -0,0 +1,111 @@
+#Load packages
+import math
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+from filters import category_index, sorted_index
+
+# Display helpers shared by the Streamlit applications
+# Tables stay numeric while they are scored, sorted and filtered and are only turned into text here, just before rendering
+
+# Format a table for display: dates as day-month-year and decimals without trailing zeros, missing values are left empty
+# precision is either a number of decimal places for every decimal column or a dictionary of places per column,
+# columns without a precision are shown in full
+# Columns are rounded and turned into text by Arrow compute kernels, a whole column at a time without a Python call per cell
+def format_table(df, precision=None, date_format="%d-%m-%Y"):
+	formatted = {}
+	for col in df.columns:
+		values = df[col]
+		if pd.api.types.is_datetime64_any_dtype(values):
+			text = pc.strftime(pa.array(values, from_pandas=True), format=date_format)
+		elif pd.api.types.is_float_dtype(values):
+			places = precision.get(col) if isinstance(precision, dict) else precision
+			numbers = pa.array(values, from_pandas=True)
+			text = pc.cast(numbers if places is None else pc.round(numbers, places), pa.string())
+		else:
+			formatted[col] = values
+			continue
+		formatted[col] = pd.Series(text.to_numpy(zero_copy_only=False), index=df.index)
+	return pd.DataFrame(formatted, index=df.index)
+
+# Number of VCTs shown when sorting by a score unless every VCT is asked for
+TOP_RESULTS = 20
+
+# Checkbox to show every row when only the top rows by a score column (by) are shown, returns how many rows to show
+# or None for all of them
+# Nothing is shown when there are no more rows than the top ones
+def top_results_control(num_rows, top=TOP_RESULTS, key="table", by="Score"):
+	if num_rows <= top:
+		return None
+	show_all = st.checkbox(f"Show all {num_rows} VCTs", key=f"{key}_show_all",
+		help=f"Only the top {top} VCTs by {by} are shown by default")
+	return None if show_all else top
+
+# Number of pages needed to show a table
+def page_count(num_rows, page_size):
+	return max(1, math.ceil(num_rows / page_size))
+
+# Rows of the given page (numbered from 1) of a table that has already been sorted and filtered
+def paginate(df, page, page_size):
+	start = (page - 1) * page_size
+	return df.iloc[start:start + page_size]
+
+# Draw the rows per page and page number widgets for a table of num_rows rows
+# Returns the page number and page size, or None when every row is shown
+def page_controls(num_rows, page_sizes=(25, 50, 100), key="table"):
+	size_col, page_col = st.columns(2)
+	page_size = size_col.selectbox("Rows per page:", list(page_sizes) + ["All"], key=f"{key}_page_size")
+	if page_size == "All" or num_rows <= page_size:
+		return None
+
+	# Keep the selected page in range when sorting or filtering changes the number of rows
+	pages = page_count(num_rows, page_size)
+	if st.session_state.get(f"{key}_page", 1) > pages:
+		st.session_state[f"{key}_page"] = pages
+	page = page_col.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+	return page, page_size
+
+# Slice of the rows on the page chosen with page_controls
+def page_slice(page):
+	if page is None:
+		return slice(0, None)
+	page_number, page_size = page
+	return slice((page_number - 1) * page_size, page_number * page_size)
+
+# Rows of the page chosen with page_controls, formatted for display
+def format_page(df, page, precision=None):
+	return format_table(df if page is None else paginate(df, *page), precision)
+
+# The rows of a ScoreTable (see scoremodel.py) on the page chosen with page_controls, formatted for display
+# and numbered from 1; rows are the sorted row positions and score the Score of every row or None
+def page_table(table, score, rows, page, precision=None):
+	shown = page_slice(page)
+	rows = rows[shown]
+	return format_table(table.take(rows, score, index=range(shown.start + 1, shown.start + len(rows) + 1)), precision)
+
+# Filter widgets for the chosen columns of a dataset, returning the ranges and categories to pass to filters.filter_rows
+# Numeric and date columns get a range slider and text or categorical columns a multiselect,
+# a filter is only returned once it has been narrowed from every value
+def filter_controls(dataset, columns, container=st, key="filter"):
+	ranges, categories = {}, {}
+	for col in columns:
+		if col in dataset.stats or pd.api.types.is_datetime64_any_dtype(dataset.frame[col]):
+			index = sorted_index(dataset, col)
+			bounds = index.bounds()
+			if bounds is None or bounds[0] == bounds[1]:
+				continue
+			if index.is_date:
+				low, high = container.slider(f"{col}:", min_value=bounds[0].date(), max_value=bounds[1].date(),
+					value=(bounds[0].date(), bounds[1].date()), format="DD-MM-YYYY", key=f"{key}_{col}")
+				low, high = pd.Timestamp(low), pd.Timestamp(high)
+			else:
+				low, high = container.slider(f"{col}:", min_value=float(bounds[0]), max_value=float(bounds[1]),
+					value=(float(bounds[0]), float(bounds[1])), key=f"{key}_{col}")
+			if (low, high) != tuple(bounds):
+				ranges[col] = (low, high)
+		else:
+			chosen = container.multiselect(f"{col}:", category_index(dataset, col).categories, key=f"{key}_{col}")
+			if chosen:
+				categories[col] = chosen
+	return ranges, categories
@@ -0,0 +1,90 @@
+#Load packages
+import numpy as np
+import pandas as pd
+from vctdata import CategoryIndex
+
+# Filters over a loaded Dataset
+# Numeric columns and dates are filtered by ranges and text or categorical columns by sets of values,
+# each using an index built once per dataset and column, and the filters are combined as boolean masks:
+#   rows = filter_rows(dataset, ranges={"Net Assets": (50, None)}, categories={"TIDM": ["KAY", "CRWN"]})
+
+# Index of a numeric or date column: the row positions of its values from lowest to highest, missing values left out
+# A range of values is then two binary searches and the slice of rows between them
+class SortedIndex:
+	def __init__(self, values):
+		self.is_date = pd.api.types.is_datetime64_any_dtype(values)
+		keys = self._keys(values)
+		present = np.flatnonzero(~np.isnan(keys))
+		self.order = present[np.argsort(keys[present], kind="stable")]
+		self.sorted_values = keys[self.order]
+		self._length = len(keys)
+		self.order.flags.writeable = False
+		self.sorted_values.flags.writeable = False
+
+	# Values as a float array with missing values as NaN, dates as nanoseconds, so that they and their bounds compare the same way
+	def _keys(self, values):
+		values = pd.Series(values)
+		if not self.is_date:
+			return pd.to_numeric(values).to_numpy(dtype=float)
+		dates = pd.to_datetime(values)
+		keys = dates.to_numpy(dtype="datetime64[ns]").astype("int64").astype(float)
+		keys[dates.isna().to_numpy()] = np.nan
+		return keys
+
+	def __len__(self):
+		return self._length
+
+	# Lowest and highest values, None if every value is missing
+	def bounds(self):
+		if not len(self.sorted_values):
+			return None
+		low, high = self.sorted_values[0], self.sorted_values[-1]
+		if self.is_date:
+			return pd.Timestamp(int(low)), pd.Timestamp(int(high))
+		return low, high
+
+	# Positions of the rows with values from low to high inclusive, in value order, either bound may be None
+	def rows_between(self, low=None, high=None):
+		start = 0 if low is None else np.searchsorted(self.sorted_values, self._keys([low])[0], side="left")
+		end = len(self.sorted_values) if high is None else np.searchsorted(self.sorted_values, self._keys([high])[0], side="right")
+		return self.order[start:end]
+
+	# Boolean mask of the rows with values from low to high inclusive
+	def mask(self, low=None, high=None):
+		mask = np.zeros(len(self), dtype=bool)
+		mask[self.rows_between(low, high)] = True
+		return mask
+
+# SortedIndex of a numeric or date column, built the first time it is asked for and shared by every session
+def sorted_index(dataset, column):
+	return dataset.derived(("sorted_index", column), lambda: SortedIndex(dataset.frame[column]))
+
+# CategoryIndex of a text or categorical column, using the index built when the dataset was loaded if there is one
+def category_index(dataset, column):
+	if column in dataset.indexes:
+		return dataset.indexes[column]
+	return dataset.derived(("category_index", column), lambda: CategoryIndex(dataset.frame[column]))
+
+# Canonical, hashable form of a set of filters, the same whatever order they were given in
+# Filters that would keep every row (no bounds, no chosen values) are left out
+def filter_key(ranges=None, categories=None):
+	ranges = tuple(sorted((col, bounds) for col, bounds in (ranges or {}).items() if bounds != (None, None)))
+	categories = tuple(sorted((col, tuple(sorted(map(str, chosen)))) for col, chosen in (categories or {}).items() if chosen))
+	return ranges, categories
+
+# Boolean mask of the rows passing every filter
+# ranges maps numeric and date columns to (low, high) inclusive bounds, either of which may be None,
+# categories maps text and categorical columns to the values to keep
+def filter_mask(dataset, ranges=None, categories=None):
+	mask = np.ones(len(dataset.frame), dtype=bool)
+	for col, (low, high) in (ranges or {}).items():
+		if low is not None or high is not None:
+			mask &= sorted_index(dataset, col).mask(low, high)
+	for col, chosen in (categories or {}).items():
+		if chosen:
+			mask &= category_index(dataset, col).mask(chosen)
+	return mask
+
+# Positions of the rows passing every filter, in row order
+def filter_rows(dataset, ranges=None, categories=None):
+	return np.flatnonzero(filter_mask(dataset, ranges, categories))
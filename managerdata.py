@@ -0,0 +1,197 @@
+#Load packages
+import argparse
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from columnregistry import registry
+from navhistory import sheet_tidms
+from vctdata import (DATABASE_FILE, SCORING_SHEET, SNAPSHOT_DIR, apply_column_types, manager_snapshot_metadata,
+	manager_snapshot_path, read_workbook_sheet)
+
+# Ingest of the per-manager finance workbooks
+# Each workbook is parsed in its own process (openpyxl parsing is CPU bound), normalised to the VCT Database columns and
+# merged over the scoring sheet by TIDM, replacing the hand merge into the VCT Database; the result is written as a snapshot
+# that vctdata.load_dataset loads in place of the scoring sheet until the VCT Database or a manager workbook changes:
+#   python managerdata.py [--workers 4] [--output-dir snapshots]
+
+################ Define the manager workbooks - edit here when a workbook is added or its layout changes ##########################
+
+# Workbook -> (layout, values the workbook does not give itself)
+manager_workbooks = {
+	"Seneca VCT finances.xlsx": ("publish", {"VCT": "Seneca Growth Capital VCT", "Management Group": "Seneca Partners"}),
+	"Seneca VCT and Albion NAVTR.xlsx": ("publish", {"VCT": "Seneca Growth Capital VCT", "Management Group": "Seneca Partners"}),
+	"Blackfinch VCT finances.xlsx": ("publish", {"VCT": "Blackfinch Spring VCT", "Management Group": "Blackfinch Investments"}),
+	"Amati VCT.xlsx": ("amati", {}),
+	"Albion Valuation Manipulation.xlsx": ("albion", {"Management Group": "Albion Capital Group"}),
+}
+
+# Columns every workbook is normalised to, those also in the VCT Database are merged into it
+manager_columns = ["VCT", "Management Group", "AIC Sector", "TIDM", "Date of last results", "NAV per share", "Net Assets",
+	"Discount", "Charge (w/o perf fee)", "Charge (w/ perf fee)"]
+
+###################################################################################################################################
+
+# Non-empty rows of a sheet as tuples
+def _sheet_rows(sheet):
+	return [row for row in sheet.iter_rows(values_only=True) if any(value is not None for value in row)]
+
+# Values of the rows labelled in a given column, as {label: [values to the right of the label]}, first label wins
+def _labelled_values(rows, column=0):
+	labelled = {}
+	for row in rows:
+		if len(row) > column and isinstance(row[column], str):
+			labelled.setdefault(row[column].strip(), [value for value in row[column + 1:] if value is not None])
+	return labelled
+
+# First value of a label, or None
+def _first(labelled, label):
+	values = labelled.get(label)
+	return values[0] if values else None
+
+# Amount in millions from a number or text such as "£37.9m"
+def _millions(value):
+	if isinstance(value, str):
+		value = value.replace("£", "").replace(",", "").strip().rstrip("m")
+		return float(value) if value else None
+	return value
+
+# A percentage given as a fraction, as the VCT Database shows it
+def _percent(value):
+	return None if value is None or isinstance(value, str) else round(value * 100, 2)
+
+# Workbooks with a "Publish" summary sheet labelled in column B (the Seneca and Blackfinch finance workbooks): one VCT each
+# The date of last results is the date next to the NAV/share, or the latest date in the NAV sheet if there is none
+def read_publish_workbook(workbook):
+	publish = next(sheet for sheet in workbook.worksheets if sheet.title.lower().startswith("publ"))
+	labelled = _labelled_values(_sheet_rows(publish), 1)
+	dates = [value for value in labelled.get("NAV/share", []) if isinstance(value, datetime.datetime)]
+	if not dates and "NAV" in workbook.sheetnames:
+		dates = [max(row[0] for row in _sheet_rows(workbook["NAV"]) if isinstance(row[0], datetime.datetime))]
+	return [{
+		"TIDM": _first(labelled, "EPIC"),
+		"Date of last results": dates[0] if dates else None,
+		"NAV per share": _first(labelled, "NAV/share"),
+		"Net Assets": _first(labelled, "NAV (£m)"),
+		"Discount": _percent(_first(labelled, "Discount")),
+	}]
+
+# The Amati workbook: one sheet per VCT with labels in columns A and E
+def read_amati_workbook(workbook):
+	vcts = []
+	for sheet in workbook.worksheets:
+		rows = _sheet_rows(sheet)
+		if not rows or rows[0][0] != "EPIC":
+			continue
+		labelled = {**_labelled_values(rows, 4), **_labelled_values(rows, 0)}
+		vcts.append({
+			"VCT": _first(labelled, "Fund"),
+			"Management Group": _first(labelled, "Manager"),
+			"TIDM": _first(labelled, "EPIC"),
+			"Date of last results": _first(labelled, "Data Date"),
+			"NAV per share": _first(labelled, "NAV"),
+			"Net Assets": _millions(_first(labelled, "Total Assets")),
+			"Charge (w/o perf fee)": _percent(_first(labelled, "AIC Expense ratio")),
+			"Charge (w/ perf fee)": _percent(_first(labelled, "AIC w perf fee")),
+		})
+	return vcts
+
+# The Albion workbook: the DATA sheet has a block of columns per VCT headed by its TIDM, with the historic NAVs
+# (date, NAV) in the block's fourth and fifth columns
+def read_albion_workbook(workbook):
+	rows = _sheet_rows(workbook["DATA"])
+	vcts = []
+	for column, tidm in enumerate(rows[0]):
+		if not isinstance(tidm, str):
+			continue
+		navs = [(row[column + 3], row[column + 4]) for row in rows[2:]
+			if len(row) > column + 4 and isinstance(row[column + 3], datetime.datetime) and row[column + 4] is not None]
+		if navs:
+			date, nav = max(navs)
+			vcts.append({"TIDM": sheet_tidms.get(tidm, tidm), "Date of last results": date, "NAV per share": nav})
+	return vcts
+
+# Readers of each workbook layout
+readers = {"publish": read_publish_workbook, "amati": read_amati_workbook, "albion": read_albion_workbook}
+
+# Read one manager workbook as a list of VCT rows, run in a worker process
+def read_manager_workbook(path, layout, defaults):
+	workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+	try:
+		vcts = readers[layout](workbook)
+	finally:
+		workbook.close()
+	return [{**defaults, **{col: value for col, value in vct.items() if value is not None}, "Source": os.path.basename(path)}
+		for vct in vcts]
+
+# Read every manager workbook, each in its own process when workers is more than 1, as one table in the common columns
+def read_manager_workbooks(directory=".", workbooks=None, workers=None):
+	workbooks = manager_workbooks if workbooks is None else workbooks
+	paths = [os.path.join(directory, name) for name in workbooks]
+	layouts = [layout for layout, _ in workbooks.values()]
+	defaults = [values for _, values in workbooks.values()]
+	if workers == 1:
+		results = list(map(read_manager_workbook, paths, layouts, defaults))
+	else:
+		with ProcessPoolExecutor(max_workers=workers) as pool:
+			results = list(pool.map(read_manager_workbook, paths, layouts, defaults))
+	rows = [vct for vcts in results for vct in vcts]
+	managers = apply_column_types(pd.DataFrame(rows).reindex(columns=manager_columns))
+	managers["Source"] = [vct["Source"] for vct in rows]
+	return managers
+
+# Merge the manager rows over a VCT Database sheet by TIDM
+# A manager's values replace the sheet's where the manager's date of last results is not older than the sheet's;
+# VCTs not in the sheet are only added if the manager gives every column of the sheet that is scored, so a VCT with most
+# metrics missing does not move the normalisation of the others; only the sheet's columns are kept
+def merge_manager_rows(base, managers):
+	# Category columns are merged as plain values, so a manager can give a sector or TIDM the sheet does not have yet
+	merged = base.astype({col: object for col in base.columns if isinstance(base[col].dtype, pd.CategoricalDtype)})
+	managers = managers.sort_values("Date of last results", na_position="first", kind="stable")
+	columns = [col for col in manager_columns if col in merged.columns]
+	scored = [col for col in merged.columns if registry.score_of.get(col) is not None]
+	for vct in managers.to_dict("records"):
+		values = {col: vct[col] for col in columns if pd.notna(vct[col])}
+		matches = merged.index[merged["TIDM"] == vct["TIDM"]]
+		if len(matches) == 0:
+			if any(col not in values for col in scored):
+				continue
+			merged = pd.concat([merged, pd.DataFrame([values])], ignore_index=True)
+			continue
+		current = merged.loc[matches[0], "Date of last results"]
+		if pd.isna(current) or pd.isna(vct["Date of last results"]) or vct["Date of last results"] >= current:
+			for col, value in values.items():
+				merged.loc[matches[0], col] = value
+	return apply_column_types(merged)
+
+# Write the merged table as a Parquet snapshot next to the database's other snapshots, tagged with the size and modification
+# time of the database and every manager workbook
+def write_manager_snapshot(merged, database, workbooks, snapshot_dir=SNAPSHOT_DIR):
+	output = manager_snapshot_path(database, snapshot_dir)
+	table = pa.Table.from_pandas(merged, preserve_index=False)
+	metadata = dict(table.schema.metadata or {})
+	metadata.update(manager_snapshot_metadata(output, SCORING_SHEET, [database] + list(workbooks)))
+	table = table.replace_schema_metadata(metadata)
+	os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+	pq.write_table(table, output)
+	return output
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Read the manager workbooks, merge them over the VCT Database and write a snapshot.")
+	parser.add_argument("--directory", default=".", help="Directory holding the manager workbooks")
+	parser.add_argument("--database", default=DATABASE_FILE, help="VCT Database workbook to merge the manager rows over")
+	parser.add_argument("--workers", type=int, help="Worker processes, one per CPU by default, 1 reads the workbooks in turn")
+	parser.add_argument("--output-dir", default=SNAPSHOT_DIR, help="Snapshot directory, relative to the database")
+	args = parser.parse_args()
+
+	managers = read_manager_workbooks(args.directory, workers=args.workers)
+	print(managers.to_string(index=False))
+	merged = merge_manager_rows(read_workbook_sheet(args.database, SCORING_SHEET), managers)
+	skipped = sorted(set(managers["TIDM"].dropna().astype(str)) - set(merged["TIDM"].dropna().astype(str)))
+	if skipped:
+		print(f"\nNot in {SCORING_SHEET} and missing scored columns, not added: {', '.join(skipped)}")
+	workbooks = [os.path.join(args.directory, name) for name in manager_workbooks]
+	print(f"\n{len(merged)} VCTs written to {write_manager_snapshot(merged, args.database, workbooks, args.output_dir)}")
@@ -0,0 +1,375 @@
+#Load packages
+import argparse
+import csv
+import os
+import threading
+import numpy as np
+import openpyxl
+import pandas as pd
+from scoring import consistency_rank
+from filters import category_index
+from vctdata import SNAPSHOT_DIR, DerivedCache, _cache_key
+
+################ Define the historic NAV workbook - edit here if the workbook changes #############################################
+
+# One sheet per VCT, named by its TIDM, with the dividends (ex-dividend date, pence per share) in columns A and B
+# and the quarterly NAVs (date, pence per share) in columns D and E, under a header row starting "Date"
+HISTORY_FILE = "Historic NAVs and Dividends - 31 Dec 22.xlsx"
+dividend_date_column, dividend_column = 0, 1
+nav_date_column, nav_column = 3, 4
+
+# Sheets not named by the VCT's TIDM in the VCT Database
+sheet_tidms = {"AVCT": "AAVC"}
+
+# VCT Database columns that can be calculated from the history: NAV total returns (months), the annual consistency windows
+# and the date of last results
+return_columns = {"NAV tr 6 m": 6, "NAV tr 1 yr": 12, "NAV tr 3 yr": 36, "NAV tr 5 yr": 60, "NAV tr 10 yr": 120}
+consistency_window_columns = ["0 to 12 m", "12 to 24 m", "24 to 36 m"]
+last_results_column = "Date of last results"
+
+###################################################################################################################################
+
+# Loaded histories are held once per process and shared by every session
+_history_cache = {}
+_cache_lock = threading.Lock()
+
+# Dates of a list of (date, value) pairs
+def _dates(observations):
+	return pd.to_datetime([date for date, _ in observations]).to_numpy(dtype="datetime64[ns]")
+
+# Each column's values carried forward over the missing rows after them, up to the column's last value,
+# with the row of each column's last value
+def _carry_forward(values):
+	present = ~np.isnan(values)
+	rows = np.arange(len(values))[:, None]
+	sources = np.maximum.accumulate(np.where(present, rows, -1), axis=0)
+	last_rows = len(values) - 1 - np.argmax(present[::-1], axis=0)
+	filled = np.take_along_axis(values, np.maximum(sources, 0), axis=0)
+	filled[(sources < 0) | (rows > last_rows)] = np.nan
+	return filled, last_rows
+
+# Read the dividends and NAVs of one VCT sheet as two lists of (date, value) pairs
+def read_history_sheet(rows):
+	dividends, navs = [], []
+	header_found = False
+	for row in rows:
+		row = tuple(row) + (None,) * (nav_column + 1 - len(row))
+		if not header_found:
+			header_found = row[0] == "Date"
+			continue
+		if row[dividend_date_column] is not None and row[dividend_column] is not None:
+			dividends.append((row[dividend_date_column], float(row[dividend_column])))
+		if row[nav_date_column] is not None and row[nav_column] is not None:
+			navs.append((row[nav_date_column], float(row[nav_column])))
+	return dividends, navs
+
+# Read every VCT sheet of the workbook as {TIDM: (dividends, navs)}, sheets without the header row are skipped
+def read_history_workbook(path):
+	workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+	try:
+		history = {}
+		for sheet in workbook.worksheets:
+			dividends, navs = read_history_sheet(sheet.iter_rows(values_only=True))
+			if navs:
+				history[sheet_tidms.get(sheet.title, sheet.title)] = (dividends, navs)
+		return history
+	finally:
+		workbook.close()
+
+# NAV and dividend history of every VCT as (dates x VCTs) arrays on the NAV dates
+# Each VCT's dividends are added to its first NAV date on or after the ex-dividend date, and the growth of 1
+# invested with dividends reinvested at NAV is kept as a cumulative product, so the total return between any
+# two dates is one division for every VCT at once
+# The NAV dates are those of every VCT together, so returns are read from each VCT's growth carried forward from its
+# last NAV on or before a date
+class NavHistory:
+	# Number of return windows kept, the least recently used are dropped first
+	max_windows = 64
+
+	# history maps each VCT to its (dividends, navs) lists of (date, value) pairs
+	# A history built from a previous one reuses the arrays of every VCT not in changed and only calculates the changed VCTs
+	def __init__(self, history, version=None, previous=None, changed=()):
+		self._history = history
+		self.vcts = list(history)
+		self.version = version
+		self._positions = {vct: i for i, vct in enumerate(self.vcts)}
+		# VCTs that have had observations appended since the workbook was read
+		self.updated = set() if previous is None else previous.updated | set(changed)
+		changed = set(self.vcts if previous is None else changed)
+		self.dates = np.unique(np.concatenate([_dates(history[vct][1]) for vct in changed]
+			+ ([] if previous is None else [previous.dates])))
+
+		self.navs = np.full((len(self.dates), len(self.vcts)), np.nan)
+		self.dividends = np.zeros_like(self.navs)
+		self.growth = np.full_like(self.navs, np.nan)
+		previous_rows = None if previous is None else np.searchsorted(self.dates, previous.dates)
+		for j, vct in enumerate(self.vcts):
+			if vct in changed:
+				self._calculate(j, *history[vct])
+			else:
+				k = previous._positions[vct]
+				self.navs[previous_rows, j] = previous.navs[:, k]
+				self.dividends[previous_rows, j] = previous.dividends[:, k]
+				self.growth[previous_rows, j] = previous.growth[:, k]
+
+		self.filled, self.last_rows = _carry_forward(self.growth)
+
+		for array in (self.dates, self.navs, self.dividends, self.growth, self.filled, self.last_rows):
+			array.flags.writeable = False
+		self._returns = DerivedCache(self.max_windows)
+
+	# Fill in the NAVs, dividends and growth of the VCT in column j
+	def _calculate(self, j, dividends, navs):
+		self.navs[np.searchsorted(self.dates, _dates(navs)), j] = [nav for _, nav in navs]
+
+		# Dividends after the last NAV date are left out until the next NAV is added
+		own_rows = np.flatnonzero(~np.isnan(self.navs[:, j]))
+		if dividends:
+			paid_at = np.searchsorted(self.dates[own_rows], _dates(dividends), side="left")
+			paid = paid_at < len(own_rows)
+			np.add.at(self.dividends[:, j], own_rows[paid_at[paid]], np.array([amount for _, amount in dividends])[paid])
+
+		# Growth over each period from the VCT's previous NAV, including the dividends paid in it
+		growth_factors = np.ones(len(own_rows))
+		growth_factors[1:] = (self.navs[own_rows[1:], j] + self.dividends[own_rows[1:], j]) / self.navs[own_rows[:-1], j]
+		self.growth[own_rows, j] = np.cumprod(growth_factors)
+
+	# History with new NAVs and dividends added, given as {VCT: [(date, value), ...]}, leaving this one unchanged
+	# Observations can only be appended: new NAVs must be later than a VCT's last NAV and new dividends later than its last dividend
+	# Only the VCTs given are recalculated, VCTs not in the history yet are added
+	def append(self, navs=None, dividends=None, version=None):
+		history = dict(self._history)
+		changed = set()
+		for index, additions in ((1, navs or {}), (0, dividends or {})):
+			for vct, observations in additions.items():
+				if not observations:
+					continue
+				current = list(history.get(vct, ([], [])))
+				observations = sorted((pd.Timestamp(date), float(value)) for date, value in observations)
+				if current[index] and observations[0][0] <= max(pd.Timestamp(date) for date, _ in current[index]):
+					kind = "NAVs" if index == 1 else "dividends"
+					raise ValueError(f"New {kind} for {vct} must be later than its last one")
+				current[index] = current[index] + observations
+				history[vct] = tuple(current)
+				changed.add(vct)
+		if any(not history[vct][1] for vct in changed):
+			raise ValueError("A VCT's first observations must include a NAV")
+		return NavHistory(history, version, previous=self, changed=changed)
+
+	# Metrics of the given VCTs calculated from the history up to each VCT's own last NAV date, by column name:
+	# the NAV total returns, the consistency windows and the date of the last NAV as the date of last results
+	def metrics(self, vcts):
+		positions = self.positions(vcts)
+		last_rows = [None if k is None else int(self.last_rows[k]) for k in positions]
+		metrics = {col: np.full(len(vcts), np.nan) for col in list(return_columns) + consistency_window_columns}
+		metrics[last_results_column] = pd.to_datetime([None if row is None else self.dates[row] for row in last_rows])
+
+		# VCTs with the same last NAV date are calculated together
+		for end_row in set(row for row in last_rows if row is not None):
+			members = [i for i, row in enumerate(last_rows) if row == end_row]
+			columns = [positions[i] for i in members]
+			end = self.dates[end_row]
+			for col, months in return_columns.items():
+				metrics[col][members] = self.total_return(months, end)[columns]
+			windows = self.rolling_returns(12, len(consistency_window_columns), end)
+			for i, col in enumerate(consistency_window_columns):
+				metrics[col][members] = windows[i, columns]
+		return metrics
+
+	# Positions of the given VCTs in the history arrays, None for VCTs without a history
+	def positions(self, vcts):
+		return [self._positions.get(vct) for vct in vcts]
+
+	# Position of the last NAV date on or before a date
+	# If None, the latest date every VCT has a NAV on or after, so that windows ending there cover the same period for every VCT
+	# however far ahead the NAVs of some VCTs have been added
+	def date_position(self, date=None):
+		if date is None:
+			return int(self.last_rows.min())
+		return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date), "ns"), side="right")) - 1
+
+	# Positions of the last NAV dates on or before each of the given dates, -1 for dates before the history
+	def date_positions(self, dates):
+		dates = pd.DatetimeIndex(dates).to_numpy(dtype="datetime64[ns]")
+		return np.searchsorted(self.dates, dates, side="right") - 1
+
+	# Percentage NAV total returns between pairs of date positions as a (windows x VCTs) array, each VCT's return taken
+	# between its last NAVs on or before the two dates, NaN where a window starts before a VCT's first NAV or ends after its last
+	# Returns are shared by every session, so they are read-only
+	def _window_returns(self, starts, ends):
+		starts, ends = np.asarray(starts), np.asarray(ends)
+		with np.errstate(invalid="ignore", divide="ignore"):
+			returns = np.round(100 * (self.filled[ends] / self.filled[starts] - 1), 2)
+		returns[(starts < 0) | (ends < 0)] = np.nan
+		returns.flags.writeable = False
+		return returns
+
+	# Percentage NAV total return of every VCT between two dates, NaN where a VCT has no NAV on or before the start
+	# or its last NAV is before the end
+	def total_return_between(self, start, end=None):
+		start, end = self.date_position(start), self.date_position(end)
+		return self._returns.get(("window", start, end), lambda: self._window_returns([start], [end])[0])
+
+	# Percentage NAV total returns over consecutive windows of the given number of months, going back from a date
+	# (see date_position if None), as a (windows x VCTs) array with the most recent window first
+	# Every window of every VCT is calculated at once from the cumulative growth
+	def rolling_returns(self, window_months, count, end=None):
+		end = pd.Timestamp(self.dates[self.date_position(end)])
+		bounds = self.date_positions([end - pd.DateOffset(months=window_months * i) for i in range(count + 1)])
+		return self._returns.get(("rolling", window_months, count, bounds[0]),
+			lambda: self._window_returns(bounds[1:], bounds[:-1]))
+
+	# Columns of a (rows x history VCTs) array for the given VCTs in order, NaN for VCTs without a history
+	def align(self, values, vcts):
+		positions = self.positions(vcts)
+		aligned = np.full((values.shape[0], len(positions)), np.nan)
+		present = [i for i, position in enumerate(positions) if position is not None]
+		aligned[:, present] = values[:, [positions[i] for i in present]]
+		return aligned
+
+	# Percentage NAV total return of every VCT over the given number of months up to a date (see date_position if None)
+	def total_return(self, months, end=None):
+		end = self.dates[self.date_position(end)]
+		return self.total_return_between(pd.Timestamp(end) - pd.DateOffset(months=months), end)
+
+	# Table of total returns over several windows, one row per VCT and one "NAV tr" column per window
+	def returns_table(self, windows, end=None):
+		columns = {"TIDM": self.vcts}
+		for months in windows:
+			columns[window_name(months)] = self.total_return(months, end)
+		return pd.DataFrame(columns)
+
+	# Table of the returns over consecutive windows, one row per VCT, with each VCT's average rank across the windows
+	def rolling_table(self, window_months, count, end=None):
+		returns = self.rolling_returns(window_months, count, end)
+		columns = {"TIDM": self.vcts}
+		for i in range(count):
+			start_months, end_months = window_months * (i + 1), window_months * i
+			columns[f"{end_months} to {start_months} m"] = returns[i]
+		columns["Consistency Rank"] = np.round(consistency_rank(returns.T), 2)
+		return pd.DataFrame(columns)
+
+# Column name of a return window, following the workbook's "NAV tr 6 m" and "NAV tr 5 yr" style
+def window_name(months):
+	return f"NAV tr {months // 12} yr" if months % 12 == 0 else f"NAV tr {months} m"
+
+# Log of the NAVs and dividends added since the workbook was last edited, kept in the snapshot directory next to it
+# One row per observation with the columns TIDM, Type (NAV or Dividend), Date and Value; rows are only ever appended
+def updates_path(path=HISTORY_FILE):
+	stem = os.path.splitext(os.path.basename(path))[0]
+	return os.path.join(os.path.dirname(path), SNAPSHOT_DIR, f"{stem} updates.csv")
+
+# Read the update log from a given row onwards as ({TIDM: navs}, {TIDM: dividends}, number of rows read)
+def read_updates(log_path, start=0):
+	updates = pd.read_csv(log_path, skiprows=range(1, start + 1), parse_dates=["Date"])
+	navs, dividends = {}, {}
+	for row in updates.itertuples(index=False):
+		observations = navs if row.Type == "NAV" else dividends
+		observations.setdefault(row.TIDM, []).append((row.Date, row.Value))
+	return navs, dividends, len(updates)
+
+# Add NAVs and dividends, given as {TIDM: [(date, value), ...]}, to the end of the update log
+def write_updates(log_path, navs=None, dividends=None):
+	os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+	new_file = not os.path.exists(log_path)
+	with open(log_path, "a", newline="") as f:
+		writer = csv.writer(f)
+		if new_file:
+			writer.writerow(["TIDM", "Type", "Date", "Value"])
+		for kind, additions in (("NAV", navs or {}), ("Dividend", dividends or {})):
+			for vct, observations in additions.items():
+				for date, value in observations:
+					writer.writerow([vct, kind, pd.Timestamp(date).strftime("%Y-%m-%d"), value])
+
+# Size of a file, None if it does not exist
+def _file_size(path):
+	return os.path.getsize(path) if os.path.exists(path) else None
+
+# Load the NAV history from a workbook with the update log applied
+# The workbook is only re-read when it has changed on disk; when only the log has grown, just its new rows are appended
+# to the loaded history, which recalculates only the VCTs they are for
+def load_history(path=HISTORY_FILE):
+	key = _cache_key(path, "")
+	log_path = updates_path(path)
+	log_size = _file_size(log_path)
+	with _cache_lock:
+		cached = _history_cache.get(key[0])
+	if cached is not None and cached[0] == key and cached[1] == log_size:
+		return cached[3]
+
+	if cached is not None and cached[0] == key and log_size is not None and (cached[1] or 0) < log_size:
+		history, applied = cached[3], cached[2]
+	else:
+		history, applied = NavHistory(read_history_workbook(path), version=key[2:] + (0,)), 0
+	if log_size is not None:
+		navs, dividends, count = read_updates(log_path, applied)
+		applied += count
+		history = history.append(navs, dividends, version=key[2:] + (applied,))
+	with _cache_lock:
+		_history_cache[key[0]] = (key, log_size, applied, history)
+	return history
+
+# Dataset with the metrics of every VCT that has had NAVs or dividends added recalculated from the history
+# A VCT's row is only replaced when its last NAV is later than the date of last results in the dataset, so values from
+# a workbook that is more up to date than the history are kept and the date of last results never goes back
+# Only those VCTs' rows and the statistics of the changed columns are recalculated, the rest of the dataset is reused
+# The dataset is returned as it is if nothing has been added to the history
+def with_history_updates(dataset, path=HISTORY_FILE):
+	if not os.path.exists(path) or not os.path.exists(updates_path(path)):
+		return dataset
+	history = load_history(path)
+	if not history.updated:
+		return dataset
+	return dataset.derived(("history_updates", history.version), lambda: _updated_dataset(dataset, history))
+
+def _updated_dataset(dataset, history):
+	index = category_index(dataset, "TIDM")
+	rows = np.concatenate([index.rows(vct) for vct in sorted(history.updated)])
+	metrics = history.metrics(list(dataset.frame["TIDM"].iloc[rows]))
+	if last_results_column in dataset.frame.columns:
+		current = dataset.frame[last_results_column].to_numpy()[rows]
+		newer = np.asarray(pd.isna(current) | (metrics[last_results_column] > current))
+		rows = rows[newer]
+		metrics = {col: metric[newer] for col, metric in metrics.items()}
+	if not len(rows):
+		return dataset
+	values = {col: metric for col, metric in metrics.items() if col in dataset.frame.columns}
+	return dataset.with_values(rows, values, version=(dataset.version, history.version))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Calculate NAV total returns from the historic NAV and dividend workbook.")
+	parser.add_argument("workbook", nargs="?", default=HISTORY_FILE, help="Historic NAV and dividend workbook")
+	parser.add_argument("--months", type=int, nargs="+", default=[6, 12, 36, 60, 120], help="Return windows in months")
+	parser.add_argument("--end", help="Date the returns are calculated up to, by default the latest date every VCT has a NAV on or after")
+	parser.add_argument("--rolling", type=int, nargs=2, metavar=("MONTHS", "COUNT"),
+		help="Show the returns over COUNT consecutive windows of MONTHS months instead, with each VCT's average rank")
+	parser.add_argument("--add-nav", nargs=3, action="append", default=[], metavar=("TIDM", "DATE", "NAV"),
+		help="Add a NAV to the update log before calculating (may be repeated)")
+	parser.add_argument("--add-dividend", nargs=3, action="append", default=[], metavar=("TIDM", "DATE", "AMOUNT"),
+		help="Add a dividend to the update log before calculating (may be repeated)")
+	parser.add_argument("--output", help="CSV file to write, defaults to standard output")
+	args = parser.parse_args()
+
+	history = load_history(args.workbook)
+	if args.add_nav or args.add_dividend:
+		# Check the observations can be appended before logging them
+		try:
+			additions = []
+			for observations in (args.add_nav, args.add_dividend):
+				grouped = {}
+				for vct, date, value in observations:
+					grouped.setdefault(vct, []).append((pd.Timestamp(date), float(value)))
+				additions.append(grouped)
+			history.append(*additions)
+		except ValueError as e:
+			parser.error(str(e))
+		write_updates(updates_path(args.workbook), *additions)
+		history = load_history(args.workbook)
+	if args.rolling:
+		table = history.rolling_table(*args.rolling, args.end)
+	else:
+		table = history.returns_table(args.months, args.end)
+	if args.output:
+		table.to_csv(args.output, index=False)
+	else:
+		print(table.to_string(index=False))
@@ -1,7 +1,13 @@
 #Load packages
-import pandas as pd
 import streamlit as st
 import math
+from columnregistry import registry
+from display import filter_controls, format_page, page_controls, top_results_control
+from filters import filter_mask
+from navhistory import with_history_updates
+from scoring import top_order
+from timing import StageTimer
+from vctdata import DATABASE_FILE, PERFORMANCE_SHEET, load_dataset
 
 # Set the title and introduction of the application
 st.title("VCT Performance Database")
@@ -9,18 +15,28 @@ st.subheader("Introduction")
 st.write("Welcome to the VCT Performance Database tool! Explore the performance of Venture Capital Trusts (VCTs) in greater detail."
 	" Customize the table by selecting parameters of interest and identify the VCTs alligning with your client's investment needs.")
 
+# Time each stage of this rerun, see timing.py
+timer = StageTimer("performancedatabase")
 
 ################ Define excel sheet and column lists - edit here if columns changed in source spreadsheet #########################
 
-# Read the data from the specified Excel file and sheet using pandas
-df = pd.read_excel("VCT Database.xlsm", sheet_name="Streamlit_Performance", engine="openpyxl")
+# Read the data from the specified Excel file and sheet (parsed once and reused until the workbook changes)
+# NAVs and dividends added to the NAV history since the workbook was last edited update the VCTs they are for
+dataset = with_history_updates(load_dataset(DATABASE_FILE, PERFORMANCE_SHEET))
+df = dataset.frame
+timer.lap("load")
 
-# Define some column lists to manage the selection and display of data
+# Define some column lists to manage the selection and display of data, the columns are declared in columnregistry.py
 no_tickbox_columns = ["VCT"]
-non_numeric_columns = ["VCT", "Management Group", "AIC Sector", "TIDM", "Date of last results"]
-date_columns = ["Date of last results"]
-no_of_basic = len(non_numeric_columns) - 1
-no_of_performance = 14 						#Adding another Performance column: Update this number
+
+# The sheet's columns in their tickbox groups, looked up in the column registry once per dataset
+# Every column after the basic information is a performance column, including any not yet in the registry
+def performance_groups():
+	groups = registry.grouped(df.columns)
+	return {"Basic Information": groups["Basic Information"], "Performance": [col for col in df.columns
+		if col not in no_tickbox_columns and registry.group_of.get(col) != "Basic Information"]}
+
+column_groups = dataset.derived(("performance_groups",), performance_groups)
 
 ###################################################################################################################################
 
@@ -30,24 +46,21 @@ st.subheader("Parameters")
 # Initialize the list of selected columns with the default non-tickbox columns
 selected_columns = no_tickbox_columns.copy()
 
-# Create a new vector of columns for the "Column Selection" section
-tickbox_columns = [col for col in df.columns if col not in no_tickbox_columns]
-
 # Create an expander for column selection
 column_expander = st.expander("Select the parameters you wish to include in the table here:")
 
 # Function to create tickboxes for parameter selection
-def tickboxes(name, start_column, end_column):
+def tickboxes(name, group_columns):
 	column_expander.write(name)
 	num_columns = 3
-	num_rows = math.ceil(end_column / num_columns)
+	num_rows = math.ceil(len(group_columns) / num_columns)
 	columns_per_row = num_columns
 	
 	cols = []
 	for _ in range(num_rows):
 		cols.append(column_expander.columns(columns_per_row))
 		
-	for i, column in enumerate(tickbox_columns[start_column:(start_column + end_column)]):
+	for i, column in enumerate(group_columns):
 		row = i // columns_per_row
 		col = i % columns_per_row
 		checkbox = cols[row][col].checkbox(column, value=True, key=f"checkbox_{column}")
@@ -55,23 +68,20 @@ def tickboxes(name, start_column, end_column):
 			selected_columns.append(column)
 
 # Include tickboxes for parameter selection in the application
-tickboxes("Basic Information", 0, no_of_basic)
-tickboxes("Performance", no_of_basic, no_of_performance)
+tickboxes("Basic Information", column_groups["Basic Information"])
+tickboxes("Performance", column_groups["Performance"])
+timer.lap("tickboxes")
 
 # Create a new DataFrame with the selected columns only
 filtered_df = df[selected_columns]
 
 	
-# Convert date columns to day-month-year format
-for col in date_columns:
-	if col in filtered_df.columns:
-		filtered_df[col] = filtered_df[col].dt.strftime("%d-%m-%Y")
 
-
-score_columns = [col for col in selected_columns if col not in non_numeric_columns]
+score_columns = [col for col in selected_columns if registry.type_of.get(col, "number") == "number"]
 
 if score_columns:
 	filtered_df["Average Score"] = filtered_df[score_columns].mean(axis=1).round(2)
+timer.lap("average score")
 
 # Add a section for Sorting the Results
 st.subheader("Sort and Filter")
@@ -86,42 +96,66 @@ sort_columns = ["Score"] + list(filtered_df.columns[:-1]) if "Score" in filtered
 sort_by = st.selectbox("Sort By:", sort_columns, key="sort_by")
 
 # Sort the DataFrame based on the selected column
-if sort_by in date_columns:
+if registry.type_of.get(sort_by) == "date":
 	sort_order = st.radio("Sort Order", ["Earliest first", "Latest first"], index=0, key="sort_order")
 	ascending = True if sort_order == "Earliest first" else False
 	filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
-elif sort_by in non_numeric_columns:
+elif registry.type_of.get(sort_by) in ("text", "category"):
 	sort_order = st.radio("Sort Order", ["A - Z", "Z - A"], index=0, key="sort_order")
 	ascending = True if sort_order == "A - Z" else False
 	filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
 else:
 	sort_order = st.radio("Sort Order", ["Descending", "Ascending"], index=0, key="sort_order")
-	if "Score" in filtered_df and sort_by == "Score":
-		filtered_df = filtered_df.sort_values(by=sort_by, ascending=(sort_order == "Ascending"), ignore_index=True)
-	else:
-		ascending = sort_order == "Ascending"
+	ascending = sort_order == "Ascending"
+	# Sorting by Average Score is left until after filtering so only the top VCTs need ordering
+	if sort_by != "Average Score":
 		filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
-
-# Format numerical values to remove trailing zeros
-for col in sort_columns:
-	filtered_df[col] = filtered_df[col].apply(lambda x: str(x).rstrip("0").rstrip(".") if isinstance(x, float) else x)
+timer.lap("sort")
 
 # Add a filter by AIC Sector option if AIC Sector column is selected
 if "AIC Sector" in selected_columns:
 	st.write("Filter the results by AIC Sector to remove VCTs that are not relevant to your search.")
-	# Get unique AIC Sectors from the DataFrame
-	aic_sectors = df["AIC Sector"].unique()
+	# The AIC Sectors are indexed when the data is loaded
+	aic_sectors = dataset.indexes["AIC Sector"].categories
 	# Allow users to select multiple AIC Sectors to filter the data
 	selected_aic_sectors = st.multiselect("Filter by AIC Sector:", aic_sectors)
-	# Filter the DataFrame based on the selected AIC Sectors
+	# Filter the DataFrame based on the selected AIC Sectors, its index still holds the dataset row positions
 	if selected_aic_sectors:
-		filtered_df = filtered_df[filtered_df["AIC Sector"].isin(selected_aic_sectors)]
+		filtered_df = filtered_df[dataset.indexes["AIC Sector"].mask(selected_aic_sectors)[filtered_df.index]]
+
+# Add a filter by Management Group from the same index if Management Group column is selected
+if "Management Group" in selected_columns:
+	selected_management_groups = st.multiselect("Filter by Management Group:", dataset.indexes["Management Group"].categories)
+	if selected_management_groups:
+		filtered_df = filtered_df[dataset.indexes["Management Group"].mask(selected_management_groups)[filtered_df.index]]
+
+# Add filters on any of the other selected columns: ranges of numbers and dates, or sets of values
+filter_expander = st.expander("Filter by other parameters here:")
+filter_by = filter_expander.multiselect("Filter by:", [col for col in selected_columns
+	if col not in ["VCT", "AIC Sector", "Management Group"]], key="filter_by")
+ranges, categories = filter_controls(dataset, filter_by, filter_expander)
+if ranges or categories:
+	filtered_df = filtered_df[filter_mask(dataset, ranges, categories)[filtered_df.index]]
+
+# Pick the top VCTs by Average Score, or all of them in order if asked for
+if sort_by == "Average Score":
+	top = top_results_control(len(filtered_df), by="Average Score")
+	filtered_df = filtered_df.iloc[top_order(filtered_df["Average Score"].to_numpy(), top, ascending)]
 
 # Reset the index to start from 1
 filtered_df.index = range(1, len(filtered_df) + 1)
+timer.lap("filter")
 # Display the filtered DataFrame in a table format
 st.subheader("Table")
 st.write("View the table in full by selecting the arrows in the top right corner:")
 
-st.table(filtered_df)
+# Display the table a page at a time, dates and numerical values are only formatted (day-month-year, no trailing zeros) here
+page = page_controls(len(filtered_df))
+display_df = format_page(filtered_df, page, registry.precision)
+timer.lap("format")
+st.table(display_df)
+timer.lap("render")
+
+# Log the stage timings and show them in a debug panel when timing is enabled
+timer.report()
 
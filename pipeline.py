@@ -0,0 +1,29 @@
+# Memoised stages for the Streamlit applications
+# Streamlit reruns the whole script on every interaction, so each stage of the table pipeline
+# (column selection -> sub-scores -> weighted score -> sort -> filter -> format) remembers its last inputs and result
+# and is only recomputed when its own inputs or the result of a stage it depends on has changed
+
+class Pipeline:
+	def __init__(self):
+		# Stage name -> (key, version, result)
+		self._stages = {}
+
+	# Run a stage, reusing its last result if its inputs and the stages it comes after are unchanged
+	# inputs must be hashable and compute is called with no arguments
+	def stage(self, name, compute, inputs=(), after=()):
+		key = (tuple(inputs), tuple(self.version(stage) for stage in after))
+		cached = self._stages.get(name)
+		if cached is not None and cached[0] == key:
+			return cached[2]
+		result = compute()
+		self._stages[name] = (key, 0 if cached is None else cached[1] + 1, result)
+		return result
+
+	# Number of times a stage's result has changed, stages that come after it are rerun when this changes
+	def version(self, name):
+		cached = self._stages.get(name)
+		return None if cached is None else cached[1]
+
+	# Forget every stage so that the next run recomputes everything
+	def clear(self):
+		self._stages.clear()
@@ -0,0 +1,122 @@
+#Load packages
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from columnregistry import registry
+from display import page_table
+from scoremodel import result_cache, score_vector, sort_rows
+
+# Prefetching of the Scoring Tool tables a session is likely to ask for next
+# After each rerun the tables for the neighbouring weights (each slider one step up or down) and for the other sort order
+# are computed in a small background thread pool and put in the shared result cache (see scoremodel.result_cache),
+# so that moving a slider or flipping the sort order is a cache hit. A session's queued work is cancelled as soon as
+# its state moves on, and work already running stops at its next step
+# Prefetched results only fill the cache's free room and are held as the least recently used, so they never push out
+# a result some session has looked up; one that is looked up is then kept like any other
+
+################ Define the prefetch limits - edit here to change how much work is done in the background ########################
+
+# Background threads shared by every session, 0 turns prefetching off
+PREFETCH_WORKERS = 2
+
+# Most tables prefetched for one state of a session
+PREFETCH_LIMIT = 24
+
+# Most rows in a prefetched table, tables of more rows than this (all the rows of a large sheet) are only built when shown
+PREFETCH_MAX_ROWS = 100
+
+# Range of the weight sliders
+MIN_WEIGHT, MAX_WEIGHT = 1, 10
+
+###################################################################################################################################
+
+# Weights one slider step away from the given weights, each within the slider range
+def neighbouring_weights(weights):
+	neighbours = []
+	for i, weight in enumerate(weights):
+		for step in (-1, 1):
+			if MIN_WEIGHT <= weight + step <= MAX_WEIGHT:
+				neighbours.append(weights[:i] + (weight + step,) + weights[i + 1:])
+	return neighbours
+
+# Marks a prefetched result the cache had no room for
+NOT_HELD = object()
+
+# Computes likely next tables for each session in a bounded thread pool, one batch of work per session at a time
+# Results are put in the cache with the same keys ScoringTool.py looks them up with
+class Prefetcher:
+	def __init__(self, cache, workers=PREFETCH_WORKERS, limit=PREFETCH_LIMIT, max_rows=PREFETCH_MAX_ROWS):
+		self.cache = cache
+		self.limit = limit
+		self.max_rows = max_rows
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") if workers else None
+		# Session -> (generation, state, futures), forgotten with the session
+		self._sessions = weakref.WeakKeyDictionary()
+		self._lock = threading.Lock()
+		self.scheduled = self.cancelled = self.computed = 0
+
+	# Whether work scheduled for a session is still for its current state
+	def _is_current(self, session, generation):
+		with self._lock:
+			return self._sessions.get(session, (None,))[0] == generation
+
+	# Prefetch the tables next to a session's current table, cancelling the work scheduled for its previous state
+	# score_state, filter_state and the sort settings are the parts of the result cache keys ScoringTool.py uses
+	def schedule(self, session, score_view, score_state, filter_state, filtered_rows, sort_by, ascending, top, page):
+		if self._executor is None:
+			return
+		shown = len(filtered_rows) if top is None else min(top, len(filtered_rows))
+		if page is None and shown > self.max_rows:
+			return
+		state = (score_state, filter_state, sort_by, ascending, top, page)
+		dataset_version, selected_columns, weights, history = score_state
+		targets = [((dataset_version, selected_columns, neighbour, history), ascending) for neighbour in neighbouring_weights(weights)]
+		targets = [(score_state, not ascending)] + targets
+		with self._lock:
+			generation, last_state, futures = self._sessions.get(session, (0, None, []))
+			if state == last_state:
+				return
+			for future in futures:
+				if future.cancel():
+					self.cancelled += 1
+			generation += 1
+			# Each table adds at most a score, a row order and the table itself to the cache
+			limit = min(self.limit, self.cache.free() // 3)
+			futures = [self._executor.submit(self._prefetch, session, generation, score_view, target_state, filter_state,
+				filtered_rows, sort_by, target_ascending, top, page) for target_state, target_ascending in targets[:limit]]
+			self.scheduled += len(futures)
+			self._sessions[session] = (generation, state, futures)
+
+	# Compute and cache one table, stopping between steps if the session has moved on or the cache has no room left
+	def _prefetch(self, session, generation, score_view, score_state, filter_state, filtered_rows, sort_by, ascending, top, page):
+		if not self._is_current(session, generation):
+			return
+		weights = score_state[2]
+		score = self._fill(("score", score_state), lambda: score_vector(score_view, list(weights)) if weights else None)
+		if score is NOT_HELD or not self._is_current(session, generation):
+			return
+		sort_state = (score_state, filter_state, sort_by, ascending, top)
+		rows = self._fill(("sort", sort_state), lambda: sort_rows(score_view, score, filtered_rows, sort_by, ascending, top))
+		if rows is NOT_HELD or not self._is_current(session, generation):
+			return
+		self._fill(("table", sort_state, page), lambda: page_table(score_view, score, rows, page, registry.precision))
+
+	# Cached result of a key, computing and caching it as the least recently used if it is not held
+	# NOT_HELD if the cache has no room for it
+	def _fill(self, key, compute):
+		result = self.cache.peek(key, NOT_HELD)
+		if result is NOT_HELD:
+			result = compute()
+			if not self.cache.put(key, result, recent=False):
+				return NOT_HELD
+			with self._lock:
+				self.computed += 1
+		return result
+
+	# Counts of the tables scheduled, the queued work cancelled and the results computed
+	def stats(self):
+		with self._lock:
+			return {"scheduled": self.scheduled, "cancelled": self.cancelled, "computed": self.computed}
+
+# The prefetcher of the Scoring Tool, shared by every session in the process
+prefetcher = Prefetcher(result_cache)
@@ -0,0 +1,75 @@
+#Load packages
+import argparse
+import json
+import sys
+import numpy as np
+import pandas as pd
+from navhistory import with_history_updates
+from scoremodel import no_tickbox_columns, ScoreTable, profile_scores, score_columns_for, weight_vector
+from vctdata import DATABASE_FILE, SCORING_SHEET, load_dataset
+
+# Headless batch scoring with the VCT Scoring Tool model
+# Scores every weight profile in a file against the VCT dataset, loaded once, in one matrix operation and writes the ranked Score tables as one CSV:
+#   python score_profiles.py profiles.json [--output ranked.csv] [--exclude COLUMN ...]
+# Profiles are given as JSON, {"profile name": {"score column": weight, ...}, ...},
+# or as CSV with a "Profile" column and one column per score column
+# Score columns a profile does not weight get the default slider weight of 5
+
+# Read the weight profiles from a JSON or CSV file as a dictionary of {profile name: {score column: weight}}
+def read_profiles(path):
+	if path.lower().endswith(".csv"):
+		frame = pd.read_csv(path)
+		if "Profile" not in frame.columns:
+			raise ValueError(f"{path} has no 'Profile' column")
+		profiles = {}
+		for row in frame.to_dict("records"):
+			name = str(row.pop("Profile"))
+			profiles[name] = {col: weight for col, weight in row.items() if pd.notna(weight)}
+	else:
+		with open(path) as f:
+			profiles = json.load(f)
+		if not isinstance(profiles, dict) or not all(isinstance(weights, dict) for weights in profiles.values()):
+			raise ValueError(f"{path} must map each profile name to a dictionary of score column weights")
+
+	for name, weights in profiles.items():
+		for col, weight in weights.items():
+			if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+				raise ValueError(f"Profile '{name}' has an invalid weight for '{col}': {weight}")
+	return profiles
+
+# Score every profile with a single matrix multiply and rank its VCTs from highest to lowest Score,
+# stacking the ranked tables with the profile name
+def score_profiles(dataset, profiles, selected_columns):
+	table = ScoreTable(dataset, selected_columns)
+	score_columns = score_columns_for(selected_columns)
+	weight_matrix = [weight_vector(score_columns, weights) for weights in profiles.values()]
+	scores, order = profile_scores(table, weight_matrix)
+
+	# Build all the ranked tables at once from the stacked row orders
+	rows = order.ravel()
+	ranked = table.take(rows)
+	ranked["Score"] = np.take_along_axis(scores, order, axis=1).ravel()
+	ranked.insert(0, "Rank", np.tile(np.arange(1, len(table) + 1), len(profiles)))
+	ranked.insert(0, "Profile", np.repeat(list(profiles), len(table)))
+	return ranked
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Score weight profiles against the VCT dataset and write the ranked Score tables.")
+	parser.add_argument("profiles", help="JSON or CSV file of weight profiles")
+	parser.add_argument("--workbook", default=DATABASE_FILE, help="Excel workbook holding the VCT data")
+	parser.add_argument("--exclude", action="append", default=[], help="Column to leave out of the table and scores (may be repeated)")
+	parser.add_argument("--output", help="CSV file to write, defaults to standard output")
+	args = parser.parse_args()
+
+	# The NAVs added to the history since the workbook was saved apply here as they do in the applications
+	dataset = with_history_updates(load_dataset(args.workbook, SCORING_SHEET))
+	unknown = [col for col in args.exclude if col not in dataset.frame.columns or col in no_tickbox_columns]
+	if unknown:
+		parser.error(f"cannot exclude columns: {', '.join(unknown)}")
+	selected_columns = [col for col in dataset.frame.columns if col not in args.exclude]
+
+	try:
+		ranked = score_profiles(dataset, read_profiles(args.profiles), selected_columns)
+	except ValueError as e:
+		parser.error(str(e))
+	ranked.to_csv(args.output if args.output else sys.stdout, index=False)
@@ -0,0 +1,197 @@
+#Load packages
+import numpy as np
+import pandas as pd
+from columnregistry import registry
+from scoring import average_rank, column_ranks, mean_score, normalise, rank_order, top_order, weighted_average, weighted_average_profiles
+from vctdata import DerivedCache
+
+# The VCT Scoring Tool model: which columns make up each sub-score and how the overall Score is weighted
+# Used by ScoringTool.py and by batch scoring, so both produce the same Score table
+
+################ Define the scoring model - the columns are declared in columnregistry.py, edit there if columns changed ###########
+
+no_tickbox_columns = ["VCT"]
+
+# Columns of each sub-score and the analytics columns, compiled from the registry in the order the columns are declared
+# Column types and directions are looked up in the registry itself (registry.type_of, registry.is_bad)
+performance_columns = registry.members["Performance Score"]
+consistency_columns = registry.members["Performance Consistency Rank"]
+diversification_columns = registry.members["Diversification Score"]
+analytics_columns = registry.groups["Analytics"]
+
+# Windows the Performance Consistency Rank can be calculated over: None uses the consistency columns above,
+# (months, count) uses count consecutive windows of that many months from the NAV history (see navhistory.py)
+consistency_windows = {
+	"Workbook: 3 annual windows": None,
+	"NAV history: 3 annual windows": (12, 3),
+	"NAV history: 8 half-year windows": (6, 8),
+	"NAV history: 20 quarterly windows": (3, 20),
+}
+
+# Final tables (and the scores and row orders they are built from) of the configurations used most recently,
+# shared by every session in the process
+RESULT_CACHE_SIZE = 256
+# and the memory they may hold together, a table larger than this (every row of a very large sheet) is shown but not kept
+RESULT_CACHE_BYTES = 256 * 1024 * 1024
+
+###################################################################################################################################
+
+# Results of recent Scoring Tool configurations, keyed on the canonical UI state and the dataset version
+result_cache = DerivedCache(RESULT_CACHE_SIZE, RESULT_CACHE_BYTES)
+
+# Weight given to a score column when none is set, matching the default slider position
+DEFAULT_WEIGHT = 5
+
+# Score columns produced for a selection of columns, in the order their weights are shown:
+# the sub-scores with any of their columns selected, then the selected columns weighted in the Score itself
+def score_columns_for(selected_columns):
+	score_columns = list(registry.selected_members(selected_columns))
+	return score_columns + [col for col in selected_columns if registry.score_of.get(col) == "Score"]
+
+# Weights of the score columns, given either as a list in score column order or as a dictionary by column name
+def weight_vector(score_columns, weights):
+	if isinstance(weights, dict):
+		unknown = [col for col in weights if col not in score_columns]
+		if unknown:
+			raise ValueError(f"Weights given for columns that are not scored: {', '.join(unknown)}")
+		weights = [weights.get(col, DEFAULT_WEIGHT) for col in score_columns]
+	elif len(weights) != len(score_columns):
+		raise ValueError(f"Expected {len(score_columns)} weights, got {len(weights)}")
+	if sum(weights) <= 0:
+		raise ValueError("The weights must add up to more than zero")
+	return list(weights)
+
+# Returns of every dataset VCT over consecutive windows of the NAV history as a (VCTs x windows) matrix,
+# matched to the dataset by TIDM with NaN for VCTs without a history
+def history_consistency_returns(dataset, history, window_months, count):
+	return history.align(history.rolling_returns(window_months, count), dataset.frame["TIDM"]).T
+
+# Sub-scores of a column selection as vectors by column name
+# The Performance Consistency Rank uses consistency_returns, a (VCTs x windows) matrix, instead of the consistency columns if given
+def sub_scores(dataset, selected_columns, consistency_returns=None):
+	stats = dataset.stats
+	members = registry.selected_members(selected_columns)
+	computed = {}
+
+	# Calculate diversification score if any diversification columns are selected
+	if "Diversification Score" in members:
+		common_columns = members["Diversification Score"]
+		div_scores = mean_score(stats.normalised_columns(common_columns, [registry.is_bad[col] for col in common_columns]))
+		computed["Diversification Score"] = np.round(div_scores, 2)
+
+	# Calculate performance consistency rank if any consistency columns are selected
+	if "Performance Consistency Rank" in members:
+		if consistency_returns is not None:
+			consistency_ranks = average_rank(column_ranks(np.round(consistency_returns, 3)))
+		else:
+			consistency_ranks = average_rank(stats.rank_columns(members["Performance Consistency Rank"]))
+		computed["Performance Consistency Rank"] = np.round(consistency_ranks, 2)
+
+	# Calculate performance score if any performance columns are selected
+	if "Performance Score" in members:
+		common_columns = members["Performance Score"]
+		perf_scores = mean_score(stats.normalised_columns(common_columns, [registry.is_bad[col] for col in common_columns]))
+		computed["Performance Score"] = np.round(perf_scores, 2)
+
+	return computed
+
+# Columns of the table in display order: the selected columns with each sub-score after the last column it summarises
+# and the consistency columns replaced by their average rank
+def table_columns(selected_columns):
+	last_member = {registry.score_of.get(col): i for i, col in enumerate(selected_columns)}
+	columns = []
+	for i, col in enumerate(selected_columns):
+		sub_score = registry.score_of.get(col)
+		if sub_score != "Performance Consistency Rank":
+			columns.append(col)
+		if sub_score in registry.members and sub_score != "Score" and last_member[sub_score] == i:
+			columns.append(sub_score)
+	return columns
+
+# The selected columns of a dataset with their sub-scores, without copying the dataset's columns
+# Columns are looked up in the dataset or the sub-score vectors when needed and a DataFrame is only built by take,
+# for the rows that are actually shown
+class ScoreTable:
+	def __init__(self, dataset, selected_columns, consistency_returns=None):
+		self.dataset = dataset
+		self.selected_columns = list(selected_columns)
+		self.computed = sub_scores(dataset, selected_columns, consistency_returns)
+		self.columns = table_columns(self.selected_columns)
+
+	def __len__(self):
+		return len(self.dataset.frame)
+
+	# A column as a Series indexed by row position
+	def column(self, name):
+		if name in self.computed:
+			return pd.Series(self.computed[name], name=name)
+		return self.dataset.frame[name]
+
+	# Build a DataFrame of the given row positions (every row by default), adding the Score if given
+	def take(self, rows=None, score=None, index=None):
+		rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+		data = {}
+		for col in self.columns:
+			data[col] = self.computed[col][rows] if col in self.computed else self.dataset.frame[col].array.take(rows)
+		if score is not None:
+			data["Score"] = score[rows]
+		return pd.DataFrame(data, index=range(len(rows)) if index is None else index)
+
+# ScoreTable of a column selection, computed once and shared by every session using the same selection
+# With a NAV history and windows of (months, count) the Performance Consistency Rank is calculated over those windows
+def shared_score_table(dataset, selected_columns, history=None, windows=None):
+	if windows is None:
+		return dataset.derived(("score_table", tuple(selected_columns)), lambda: ScoreTable(dataset, selected_columns))
+	return dataset.derived(("score_table", tuple(selected_columns), history.version, windows),
+		lambda: ScoreTable(dataset, selected_columns, history_consistency_returns(dataset, history, *windows)))
+
+# Normalised (VCTs x score columns) matrix of a ScoreTable that the weights are applied to
+# The sub-scores are already on a 0 to 10 scale, the other columns use the precomputed statistics
+def normalised_score_matrix(table, score_columns):
+	stats = table.dataset.stats
+	normalised_columns = []
+	for col in score_columns:
+		if registry.type_of.get(col) == "score":
+			normalised_columns.append(table.computed[col] / 10)
+		elif col in stats:
+			normalised_columns.append(stats.normalised_columns([col], [registry.is_bad.get(col, False)])[:, 0])
+		else:
+			normalised_columns.append(normalise(table.computed[col][:, None], [registry.is_bad.get(col, False)])[:, 0])
+	return np.column_stack(normalised_columns)
+
+# Positions of the given rows of a ScoreTable in display order, the first top of them if top is not None
+# The top rows by Score are picked without sorting the rest, any other column is sorted in full
+def sort_rows(table, score, rows, sort_by, ascending, top=None):
+	if sort_by == "Score":
+		return rows[top_order(score[rows], top, ascending)]
+	values = table.column(sort_by).iloc[rows]
+	return values.sort_values(ascending=ascending, kind="stable").index.to_numpy()[:top]
+
+# Weighted Score of each row of a ScoreTable, or None if none of its columns are scored
+# weights defaults to DEFAULT_WEIGHT for every score column
+def score_vector(table, weights=None):
+	score_columns = score_columns_for(table.selected_columns)
+	if not score_columns:
+		return None
+	weights = weight_vector(score_columns, weights if weights is not None else {})
+	normalised = normalised_score_matrix(table, score_columns)
+
+	# Calculate the weighted average score, scaled to the range of 0 to 10 and rounded to 2 decimal places
+	return np.round(weighted_average(normalised, weights), 2)
+
+# Score many weight profiles against every VCT at once
+# weight_matrix is (profiles x score columns), in score_columns_for order
+# Returns the (profiles x VCTs) Scores, rounded as in score_vector, and each profile's VCT row order from highest to lowest Score
+def profile_scores(table, weight_matrix):
+	score_columns = score_columns_for(table.selected_columns)
+	if not score_columns:
+		raise ValueError("None of the selected columns are scored")
+	weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype=float))
+	if weight_matrix.shape[1] != len(score_columns):
+		raise ValueError(f"Expected {len(score_columns)} weights per profile, got {weight_matrix.shape[1]}")
+	if (weight_matrix.sum(axis=1) <= 0).any():
+		raise ValueError("The weights of every profile must add up to more than zero")
+
+	normalised = normalised_score_matrix(table, score_columns)
+	scores = np.round(weighted_average_profiles(normalised, weight_matrix), 2)
+	return scores, rank_order(scores)
@@ -0,0 +1,232 @@
+#Load packages
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import numpy as np
+import pandas as pd
+from columnregistry import registry
+from filters import filter_rows
+from navhistory import with_history_updates
+from scoremodel import no_tickbox_columns, score_columns_for, score_vector, shared_score_table, sort_rows, table_columns, weight_vector
+from vctdata import DATABASE_FILE, SCORING_SHEET, DerivedCache, load_dataset
+
+# Local HTTP/JSON service scoring VCTs with the VCT Scoring Tool model, for tools that cannot run the Streamlit application
+# Uses only the standard library: an asyncio server speaking HTTP/1.1 with keep-alive, scoring in a thread pool so that
+# slow requests do not hold up the others, and an LRU cache of responses keyed on the canonical form of each request.
+# The dataset is loaded once per process and only reloaded when the workbook changes:
+#   python scoreservice.py [--port 8765]
+#   curl -s localhost:8765/score -d '{"columns": ["NAV tr 1 yr", "Discount"], "weights": {"Discount": 8}, "aic_sectors": ["VCT Generalist"]}'
+#
+#   GET  /columns  the columns that can be selected, their groups and the AIC Sectors
+#   POST /score    a Score table, the body a JSON object with any of:
+#                  "columns"     columns to include, every tickbox column by default, "VCT" is always included
+#                  "weights"     {score column: weight}, unweighted score columns get the default slider weight
+#                  "sort_by"     column to sort by, "Score" by default or the first column if none are scored
+#                  "ascending"   sort order, by default A - Z and earliest first for text and dates, highest first otherwise
+#                  "aic_sectors" AIC Sectors to keep, every sector by default
+#                  "top"         number of rows to return, every row by default
+
+################ Define the service defaults - edit here to change the port or the cache size ###################################
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Responses held in the LRU cache
+CACHE_SIZE = 256
+
+# Threads scoring requests
+WORKERS = 4
+
+# Seconds an idle keep-alive connection is held open, and largest request body accepted in bytes
+KEEP_ALIVE_SECONDS = 15
+MAX_BODY_BYTES = 1024 * 1024
+
+###################################################################################################################################
+
+# A request the service cannot answer, returned to the caller with its HTTP status
+class RequestError(Exception):
+	def __init__(self, status, message):
+		super().__init__(message)
+		self.status = status
+
+# The scoring dataset, loaded once per process (see vctdata.load_dataset) with the NAV history updates applied
+def scoring_dataset():
+	return with_history_updates(load_dataset(DATABASE_FILE, SCORING_SHEET))
+
+# Columns a request can select: every column in a tickbox group, in the sheet's order
+def selectable_columns(dataset):
+	return dataset.derived(("selectable_columns",), lambda: [col for col in dataset.frame.columns if registry.group_of.get(col) is not None])
+
+# Canonical, hashable form of a /score request: equal requests give the same key whatever order their lists and weights are in
+# Columns are put in the sheet's order, weights filled in with their defaults and the sectors sorted;
+# raises RequestError for anything the Scoring Tool would not accept
+def canonical_request(dataset, body):
+	if not isinstance(body, dict):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object")
+	unknown = set(body) - {"columns", "weights", "sort_by", "ascending", "aic_sectors", "top"}
+	if unknown:
+		raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown request fields: {', '.join(sorted(unknown))}")
+
+	selectable = selectable_columns(dataset)
+	chosen = body.get("columns", selectable)
+	if not isinstance(chosen, list) or not all(isinstance(col, str) for col in chosen):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "'columns' must be a list of column names")
+	missing = [col for col in chosen if col not in selectable and col not in no_tickbox_columns]
+	if missing:
+		raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown columns: {', '.join(missing)}")
+	chosen = set(chosen)
+	selected_columns = tuple(no_tickbox_columns + [col for col in selectable if col in chosen])
+
+	weights = body.get("weights", {})
+	if not isinstance(weights, dict) or not all(isinstance(weight, (int, float)) and not isinstance(weight, bool)
+			and 0 <= weight for weight in weights.values()):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "'weights' must map score columns to weights of zero or more")
+	score_columns = score_columns_for(selected_columns)
+	if score_columns:
+		try:
+			weights = tuple(weight_vector(score_columns, weights))
+		except ValueError as error:
+			raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+	elif weights:
+		raise RequestError(HTTPStatus.BAD_REQUEST, "None of the selected columns are scored")
+	else:
+		weights = ()
+
+	sortable = (["Score"] if score_columns else []) + table_columns(list(selected_columns))
+	sort_by = body.get("sort_by", sortable[0])
+	if sort_by not in sortable:
+		raise RequestError(HTTPStatus.BAD_REQUEST, f"Cannot sort by '{sort_by}', choose one of: {', '.join(sortable)}")
+	ascending = body.get("ascending", registry.type_of.get(sort_by) in ("text", "category", "date"))
+	if not isinstance(ascending, bool):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "'ascending' must be true or false")
+
+	sectors = body.get("aic_sectors", [])
+	if not isinstance(sectors, list) or not all(isinstance(sector, str) for sector in sectors):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "'aic_sectors' must be a list of AIC Sectors")
+	top = body.get("top")
+	if top is not None and (isinstance(top, bool) or not isinstance(top, int) or top < 1):
+		raise RequestError(HTTPStatus.BAD_REQUEST, "'top' must be a whole number of at least 1")
+	return selected_columns, weights, sort_by, ascending, tuple(sorted(set(sectors))), top
+
+# Score table of a canonical request as {"columns": [...], "rows": [[...], ...], "total": rows before "top" is applied},
+# scored, filtered and sorted as ScoringTool.py does it
+def score_request(dataset, request):
+	selected_columns, weights, sort_by, ascending, sectors, top = request
+	score_view = shared_score_table(dataset, list(selected_columns))
+	score = score_vector(score_view, list(weights)) if weights else None
+	rows = filter_rows(dataset, categories={"AIC Sector": list(sectors)})
+	total = len(rows)
+	table = score_view.take(sort_rows(score_view, score, rows, sort_by, ascending, top), score)
+	return {"columns": list(table.columns), "rows": [list(row) for row in zip(*(json_values(table[col]) for col in table.columns))],
+		"total": total}
+
+# Values of a column as JSON values: dates as year-month-day text and missing values as null
+def json_values(values):
+	if pd.api.types.is_datetime64_any_dtype(values):
+		return [None if pd.isna(value) else value.strftime("%Y-%m-%d") for value in values]
+	values = values.astype(object)
+	return [None if pd.isna(value) else value.item() if isinstance(value, np.generic) else value for value in values]
+
+# The HTTP/JSON service: the dataset is looked up on every request (a file check, see vctdata.load_dataset)
+# and responses are cached by dataset version and canonical request
+class ScoreService:
+	def __init__(self, cache_size=CACHE_SIZE, workers=WORKERS):
+		self.cache = DerivedCache(cache_size)
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score")
+
+	# Status and JSON body of a request, run in the thread pool
+	def respond(self, method, path, body):
+		dataset = scoring_dataset()
+		if path == "/columns":
+			if method != "GET":
+				raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET for /columns")
+			return self.cache.get((dataset.version, "columns"), lambda: json.dumps({
+				"columns": no_tickbox_columns + selectable_columns(dataset),
+				"groups": {group: cols for group, cols in registry.grouped(dataset.frame.columns).items() if cols},
+				"aic_sectors": [str(sector) for sector in dataset.indexes["AIC Sector"].categories],
+			}).encode())
+		if path == "/score":
+			if method != "POST":
+				raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST for /score")
+			try:
+				request = canonical_request(dataset, json.loads(body or b"{}"))
+			except json.JSONDecodeError as error:
+				raise RequestError(HTTPStatus.BAD_REQUEST, f"The request body is not JSON: {error}")
+			return self.cache.get((dataset.version, "score", request), lambda: json.dumps(score_request(dataset, request)).encode())
+		raise RequestError(HTTPStatus.NOT_FOUND, f"No such path: {path}")
+
+	# Serve one connection, reading requests until the caller closes it, asks to close it or leaves it idle
+	async def handle(self, reader, writer):
+		loop = asyncio.get_running_loop()
+		try:
+			while True:
+				try:
+					head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS)
+				except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+					return
+				try:
+					method, path, version, headers = parse_head(head)
+					keep_alive = keep_connection(version, headers)
+					length = int(headers.get("content-length", 0))
+					if length > MAX_BODY_BYTES:
+						raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"The request body is over {MAX_BODY_BYTES} bytes")
+					body = await reader.readexactly(length) if length else b""
+					status, payload = HTTPStatus.OK, await loop.run_in_executor(self._executor, self.respond, method, path.split("?")[0], body)
+				except RequestError as error:
+					status, payload = error.status, json.dumps({"error": str(error)}).encode()
+					keep_alive = keep_alive and status != HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+				except ValueError as error:
+					status, payload, keep_alive = HTTPStatus.BAD_REQUEST, json.dumps({"error": str(error)}).encode(), False
+				except Exception as error:
+					status, payload, keep_alive = HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({"error": repr(error)}).encode(), False
+				writer.write(response_head(status, len(payload), keep_alive) + payload)
+				await writer.drain()
+				if not keep_alive:
+					return
+		finally:
+			writer.close()
+
+	async def serve(self, host=HOST, port=PORT):
+		server = await asyncio.start_server(self.handle, host, port)
+		async with server:
+			await server.serve_forever()
+
+# Method, path, HTTP version and lower-cased headers of a request head, raising ValueError if it is not HTTP
+def parse_head(head):
+	lines = head.decode("latin-1").split("\r\n")
+	parts = lines[0].split(" ")
+	if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+		raise ValueError(f"Not an HTTP request: {lines[0]}")
+	headers = {}
+	for line in lines[1:]:
+		if ":" in line:
+			name, value = line.split(":", 1)
+			headers[name.strip().lower()] = value.strip()
+	return parts[0], parts[1], parts[2], headers
+
+# Whether a connection stays open after the response: by default for HTTP/1.1, only if asked for with HTTP/1.0
+def keep_connection(version, headers):
+	connection = headers.get("connection", "").lower()
+	if version == "HTTP/1.0":
+		return connection == "keep-alive"
+	return connection != "close"
+
+# Status line and headers of a JSON response
+def response_head(status, length, keep_alive):
+	return (f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\nContent-Length: {length}\r\n"
+		f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve VCT Scores over HTTP/JSON on this machine.")
+	parser.add_argument("--host", default=HOST, help="Address to listen on")
+	parser.add_argument("--port", type=int, default=PORT, help="Port to listen on")
+	parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Responses held in the LRU cache")
+	parser.add_argument("--workers", type=int, default=WORKERS, help="Threads scoring requests")
+	args = parser.parse_args()
+
+	# Load the dataset before the first request
+	scoring_dataset()
+	print(f"Scoring VCTs on http://{args.host}:{args.port}/score")
+	asyncio.run(ScoreService(args.cache_size, args.workers).serve(args.host, args.port))
@@ -0,0 +1,146 @@
+#Load packages
+import warnings
+import numpy as np
+
+# Scoring functions shared by the Streamlit applications and batch jobs
+# Each function takes a (VCTs x columns) metric matrix and works on every column at once
+
+# Mean of each row ignoring missing values, NaN where a row has no values
+def _row_mean(matrix):
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore", RuntimeWarning)
+		return np.nanmean(matrix, axis=1)
+
+# Column minimum and maximum ignoring missing values, NaN for columns with no values
+def _column_range(matrix):
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore", RuntimeWarning)
+		return np.nanmin(matrix, axis=0), np.nanmax(matrix, axis=0)
+
+# Scale each column to 0 to 1 between the given minimum and maximum
+# Columns with no spread normalise to NaN, as with the pandas calculation they replace
+def _min_max(matrix, minimum, maximum):
+	with np.errstate(invalid="ignore", divide="ignore"):
+		return (matrix - minimum) / (maximum - minimum)
+
+# Flip the normalised columns where lower values are better
+def flip(normalised, bad):
+	return np.where(np.asarray(bad, dtype=bool), 1 - normalised, normalised)
+
+# Min-max normalise each column to the range 0 to 1, flipping the columns where lower values are better
+def normalise(matrix, bad):
+	matrix = np.asarray(matrix, dtype=float)
+	minimum, maximum = _column_range(matrix)
+	return flip(_min_max(matrix, minimum, maximum), bad)
+
+# Sub-score from 0 to 10 for each row: the mean of its normalised columns, ignoring missing values
+def mean_score(normalised):
+	return 10 * _row_mean(normalised)
+
+# Rank each column from highest (1) to lowest, ties ranked in order of appearance and missing values left unranked
+def column_ranks(matrix):
+	matrix = np.asarray(matrix, dtype=float)
+	missing = np.isnan(matrix)
+	# Missing values sort last so the values present take ranks 1 to n
+	order = np.argsort(np.where(missing, np.inf, -matrix), axis=0, kind="stable")
+	ranks = np.empty_like(matrix)
+	positions = np.broadcast_to(np.arange(1, matrix.shape[0] + 1, dtype=float)[:, None], matrix.shape)
+	np.put_along_axis(ranks, order, positions, axis=0)
+	ranks[missing] = np.nan
+	return ranks
+
+# Average rank of each row across the columns
+def average_rank(ranks):
+	return _row_mean(ranks)
+
+# Rank each column and average the ranks of each row
+def consistency_rank(matrix):
+	return average_rank(column_ranks(matrix))
+
+# Weighted averages of the normalised columns for many weight profiles at once, scaled to the range 0 to 10
+# A (profiles x columns) weight matrix gives a (profiles x rows) score matrix from a single matrix multiply
+def weighted_average_profiles(normalised, weight_matrix):
+	weight_matrix = np.atleast_2d(np.asarray(weight_matrix, dtype=float))
+	return 10 * (weight_matrix @ np.asarray(normalised, dtype=float).T) / weight_matrix.sum(axis=1)[:, None]
+
+# Weighted average of the normalised columns of each row, scaled to the range 0 to 10
+def weighted_average(normalised, weights):
+	return weighted_average_profiles(normalised, [weights])[0]
+
+# Order of the rows of each profile's scores from highest to lowest, ties kept in row order and missing scores last
+def rank_order(scores):
+	scores = np.atleast_2d(np.asarray(scores, dtype=float))
+	return np.argsort(np.where(np.isnan(scores), np.inf, -scores), axis=1, kind="stable")
+
+# Positions of the k highest scores from highest to lowest (lowest first if ascending), ties kept in row order and missing scores last
+# The k winners are picked by partial selection in linear time and only they are sorted, so k much smaller than the
+# number of rows avoids sorting every row; k of None orders every row
+def top_order(scores, k=None, ascending=False):
+	scores = np.asarray(scores, dtype=float)
+	keys = np.where(np.isnan(scores), np.inf, scores if ascending else -scores)
+	if k is None or k >= len(keys):
+		return np.argsort(keys, kind="stable")
+	if k <= 0:
+		return np.empty(0, dtype=np.intp)
+
+	# Everything better than the k-th key wins, then the earliest rows tied with it fill the remaining places
+	kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+	better = np.flatnonzero(keys < kth)
+	tied = np.flatnonzero(keys == kth)[:k - len(better)]
+	winners = np.sort(np.concatenate([better, tied]))
+	return winners[np.argsort(keys[winners], kind="stable")]
+
+# Per-column statistics of a numeric table, computed once when a dataset is loaded
+# Holds the minimum, maximum, range, missing value mask, normalised values and ranks of every column,
+# so scoring only has to look columns up and take a weighted average
+class ColumnStats:
+	# Values are rounded to rank_decimals before ranking so near-equal values tie
+	def __init__(self, frame, rank_decimals=3):
+		self.columns = list(frame.columns)
+		self.rank_decimals = rank_decimals
+		self._positions = {col: i for i, col in enumerate(self.columns)}
+		matrix = frame.to_numpy(dtype=float)
+
+		self.minimum, self.maximum = _column_range(matrix)
+		self.spread = self.maximum - self.minimum
+		self.missing = np.isnan(matrix)
+		self.normalised = _min_max(matrix, self.minimum, self.maximum)
+		self.ranks = column_ranks(np.round(matrix, rank_decimals))
+		self._freeze()
+
+	def _freeze(self):
+		for array in (self.minimum, self.maximum, self.spread, self.missing, self.normalised, self.ranks):
+			array.flags.writeable = False
+
+	# Statistics of a frame that only differs from this one in the given columns, only those columns are recomputed
+	def with_columns(self, frame, columns):
+		stats = object.__new__(ColumnStats)
+		stats.columns, stats.rank_decimals, stats._positions = self.columns, self.rank_decimals, self._positions
+		positions = self.positions(columns)
+		matrix = frame[columns].to_numpy(dtype=float)
+		minimum, maximum = _column_range(matrix)
+
+		stats.minimum, stats.maximum = self.minimum.copy(), self.maximum.copy()
+		stats.minimum[positions], stats.maximum[positions] = minimum, maximum
+		stats.spread = stats.maximum - stats.minimum
+		stats.missing, stats.normalised, stats.ranks = self.missing.copy(), self.normalised.copy(), self.ranks.copy()
+		stats.missing[:, positions] = np.isnan(matrix)
+		stats.normalised[:, positions] = _min_max(matrix, minimum, maximum)
+		stats.ranks[:, positions] = column_ranks(np.round(matrix, self.rank_decimals))
+		stats._freeze()
+		return stats
+
+	def __contains__(self, column):
+		return column in self._positions
+
+	# Positions of the given columns in the statistics arrays
+	def positions(self, columns):
+		return [self._positions[col] for col in columns]
+
+	# Normalised values of the given columns, flipped where lower values are better
+	def normalised_columns(self, columns, bad):
+		return flip(self.normalised[:, self.positions(columns)], bad)
+
+	# Ranks of the given columns
+	def rank_columns(self, columns):
+		return self.ranks[:, self.positions(columns)]
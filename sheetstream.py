@@ -0,0 +1,251 @@
+#Load packages
+import argparse
+import datetime
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Streaming reader for large workbook sheets
+# The sheet is read a row at a time from a read-only workbook, so the cell objects of the whole sheet are never held,
+# and every chunk of rows is converted into one typed array per column (numbers, dates or text) before the next is read.
+# A sheet is read into a DataFrame, the same one pd.read_excel gives for a plain table, or written to Parquet chunk by
+# chunk, holding one chunk at a time however large the sheet is:
+#   python sheetstream.py VCTSpreadsheet.xlsx --sheet VCTs --header-row 1 --output "VCTs.parquet"
+
+################ Define the streaming defaults - edit here to trade memory for speed ##############################################
+
+# Rows converted at a time
+CHUNK_ROWS = 2000
+
+###################################################################################################################################
+
+# Error values of formula cells and the text pd.read_excel takes as missing, read as missing values
+EXCEL_ERRORS = {"#N/A", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#NULL!"}
+MISSING_TEXT = EXCEL_ERRORS | {"", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A",
+	"NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+
+# A cell value with errors and empty text as None and whole numbers as int, as pd.read_excel reads it
+def _cell_value(value):
+	if isinstance(value, str):
+		return None if value in MISSING_TEXT else value
+	if isinstance(value, float) and value.is_integer():
+		return int(value)
+	return value
+
+# Kind of one non-missing value
+def _value_kind(value):
+	if isinstance(value, bool):
+		return "text"
+	if isinstance(value, int):
+		return "int"
+	if isinstance(value, float):
+		return "float"
+	if isinstance(value, (datetime.datetime, datetime.date)):
+		return "date"
+	return "text"
+
+# Kind able to hold both kinds, a whole number column with a missing value becoming float
+def _common_kind(kind, other):
+	if kind is None:
+		return other
+	if other is None or other == kind:
+		return kind
+	if {kind, other} == {"int", "float"}:
+		return "float"
+	return "text"
+
+# Array of a kind from a list of values, missing values as None
+def _to_array(values, kind):
+	if kind == "int":
+		return np.array(values, dtype=np.int64)
+	if kind == "float":
+		return np.array([np.nan if value is None else value for value in values], dtype=float)
+	if kind == "date":
+		return np.array([np.datetime64("NaT") if value is None else np.datetime64(value, "us") for value in values], dtype="datetime64[us]")
+	array = np.empty(len(values), dtype=object)
+	array[:] = [np.nan if value is None else value for value in values]
+	return array
+
+# Array of a kind converted to a more general kind
+def _convert_array(array, kind):
+	if kind == "float":
+		return array.astype(float)
+	if kind == "text":
+		converted = array.astype(object)
+		if array.dtype.kind == "M":
+			converted[np.isnat(array)] = np.nan
+		return converted
+	return array
+
+# One column of a sheet as a list of typed arrays, one per chunk
+# The column's kind is the most specific that holds every value so far, earlier chunks are converted when it changes
+class ColumnBuffer:
+	def __init__(self, name, missing=0):
+		self.name = name
+		self.kind = None
+		self.chunks = []
+		self._missing = missing
+
+	def __len__(self):
+		return self._missing + sum(len(chunk) for chunk in self.chunks)
+
+	# Add a chunk of values, None for missing
+	def append(self, values):
+		kind = self.kind
+		for value in values:
+			if value is not None:
+				kind = _common_kind(kind, _value_kind(value))
+		if kind == "int" and (self._missing or None in values):
+			kind = "float"
+		if kind is None:
+			self._missing += len(values)
+			return
+		if kind != self.kind:
+			self.chunks = [_convert_array(chunk, kind) for chunk in self.chunks]
+			self.kind = kind
+		if self._missing:
+			self.chunks.append(_to_array([None] * self._missing, kind))
+			self._missing = 0
+		self.chunks.append(_to_array(values, kind))
+
+	# The whole column as one array, float NaN if every value is missing
+	def to_array(self):
+		if self.kind is None:
+			return np.full(self._missing, np.nan)
+		if self._missing:
+			self.chunks.append(_to_array([None] * self._missing, self.kind))
+			self._missing = 0
+		return np.concatenate(self.chunks) if len(self.chunks) != 1 else self.chunks[0]
+
+# Column names from a header row: blank headers as "Unnamed: <position>" and repeats numbered, as pd.read_excel names them
+def header_names(header, width=None):
+	header = list(header) + [None] * max(0, (width or 0) - len(header))
+	names, seen = [], {}
+	for position, name in enumerate(header):
+		name = f"Unnamed: {position}" if name is None or name == "" else name
+		if name in seen:
+			seen[name] += 1
+			name = f"{name}.{seen[name]}"
+		else:
+			seen[name] = 0
+		names.append(name)
+	return names
+
+# Rows of a sheet as lists of cell values in chunks of chunk_rows, trailing empty rows left out
+# Returns the header row and a generator of the chunks, the workbook is closed when the generator is finished or closed
+def iter_row_chunks(path, sheet_name, header_row=0, chunk_rows=CHUNK_ROWS):
+	workbook = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+	try:
+		sheet = workbook[sheet_name]
+		sheet.reset_dimensions()
+		rows = sheet.iter_rows(values_only=True)
+		header = []
+		for position, row in enumerate(rows):
+			if position == header_row:
+				header = _trim([_cell_value(value) for value in row])
+				break
+	except Exception:
+		workbook.close()
+		raise
+
+	def chunks():
+		try:
+			chunk, empty = [], 0
+			for row in rows:
+				values = _trim([_cell_value(value) for value in row])
+				# Empty rows are only kept once a later row has values
+				if not values:
+					empty += 1
+					continue
+				chunk += [[]] * empty + [values]
+				empty = 0
+				while len(chunk) >= chunk_rows:
+					yield chunk[:chunk_rows]
+					chunk = chunk[chunk_rows:]
+			if chunk:
+				yield chunk
+		finally:
+			workbook.close()
+	return header, chunks()
+
+# Row values without the trailing missing values
+def _trim(values):
+	end = len(values)
+	while end and values[end - 1] is None:
+		end -= 1
+	return values[:end]
+
+# Read a sheet into a DataFrame a chunk of rows at a time, with the column names in header_row
+# Columns are typed as pd.read_excel types them: whole numbers as int64 (float64 once a value is missing), numbers as float64,
+# dates as datetime64 and anything else as text
+def read_sheet_columns(path, sheet_name, header_row=0, chunk_rows=CHUNK_ROWS):
+	header, chunks = iter_row_chunks(path, sheet_name, header_row, chunk_rows)
+	buffers = [ColumnBuffer(position) for position in range(len(header))]
+	rows = 0
+	for chunk in chunks:
+		width = max(len(values) for values in chunk)
+		buffers += [ColumnBuffer(position, missing=rows) for position in range(len(buffers), width)]
+		for position, buffer in enumerate(buffers):
+			buffer.append([values[position] if position < len(values) else None for values in chunk])
+		rows += len(chunk)
+	names = header_names(header, len(buffers))
+	return pd.DataFrame({name: buffer.to_array() for name, buffer in zip(names, buffers)}, index=pd.RangeIndex(rows))
+
+# Kind of every column of a sheet, read a chunk of rows at a time without keeping the values
+# Returns the header row and one kind per column, None for a column with no values
+def column_kinds(path, sheet_name, header_row=0, chunk_rows=CHUNK_ROWS):
+	header, chunks = iter_row_chunks(path, sheet_name, header_row, chunk_rows)
+	kinds = [None] * len(header)
+	missing = [False] * len(header)
+	rows = 0
+	for chunk in chunks:
+		width = max(len(values) for values in chunk)
+		kinds += [None] * (width - len(kinds))
+		missing += [rows > 0] * (width - len(missing))
+		for position in range(len(kinds)):
+			for values in chunk:
+				value = values[position] if position < len(values) else None
+				if value is None:
+					missing[position] = True
+				else:
+					kinds[position] = _common_kind(kinds[position], _value_kind(value))
+		rows += len(chunk)
+	return header, ["float" if kind == "int" and gap else kind for kind, gap in zip(kinds, missing)]
+
+# Parquet type of each kind of column, a column with no values being written as float like read_sheet_columns reads it
+_arrow_types = {"int": pa.int64(), "float": pa.float64(), "date": pa.timestamp("us"), "text": pa.string(), None: pa.float64()}
+
+# Write a sheet to a Parquet file a chunk of rows at a time, holding one chunk at a time
+# The sheet is read twice, first for the type of every column and then for the values, so that the file has one schema;
+# columns have the types read_sheet_columns gives them, except that text columns holding other values too are written as text
+def write_sheet_parquet(path, sheet_name, output, header_row=0, chunk_rows=CHUNK_ROWS):
+	header, kinds = column_kinds(path, sheet_name, header_row, chunk_rows)
+	names = [str(name) for name in header_names(header, len(kinds))]
+	schema = pa.schema([(name, _arrow_types[kind]) for name, kind in zip(names, kinds)])
+	_, chunks = iter_row_chunks(path, sheet_name, header_row, chunk_rows)
+	rows = 0
+	with pq.ParquetWriter(output, schema) as writer:
+		for chunk in chunks:
+			columns = []
+			for position, (field, kind) in enumerate(zip(schema, kinds)):
+				values = [values[position] if position < len(values) else None for values in chunk]
+				if kind == "text":
+					values = [None if value is None else str(value) for value in values]
+				columns.append(pa.array(_to_array(values, kind or "float"), type=field.type, from_pandas=True))
+			writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+			rows += len(chunk)
+	return rows
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Stream a workbook sheet into a Parquet file without loading the whole sheet.")
+	parser.add_argument("workbook", help="Excel workbook to read")
+	parser.add_argument("--sheet", required=True, help="Sheet to read")
+	parser.add_argument("--header-row", type=int, default=0, help="Row holding the column names, counting from 0")
+	parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows converted at a time")
+	parser.add_argument("--output", required=True, help="Parquet file to write")
+	args = parser.parse_args()
+
+	rows = write_sheet_parquet(args.workbook, args.sheet, args.output, args.header_row, args.chunk_rows)
+	print(f"{rows} rows of '{args.sheet}' written to {args.output}")
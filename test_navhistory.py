@@ -0,0 +1,62 @@
+#Load packages
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from navhistory import HISTORY_FILE, NavHistory, load_history, updates_path, with_history_updates, write_updates
+from vctdata import DATABASE_FILE, SCORING_SHEET, load_dataset
+
+# Regression tests for the NAV history updates in navhistory.py: python -m pytest test_navhistory.py
+# The update log is written next to a copy of the history workbook, so the repository's own snapshot directory is not touched
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Copy of the history workbook with the given NAVs in its update log
+def history_with_navs(tmp_path, navs):
+	path = str(tmp_path / HISTORY_FILE)
+	shutil.copy(os.path.join(here, HISTORY_FILE), path)
+	write_updates(updates_path(path), navs)
+	return path
+
+def scoring_dataset():
+	return load_dataset(os.path.join(here, DATABASE_FILE), SCORING_SHEET)
+
+# A NAV older than the workbook's date of last results must not replace the workbook's values
+def test_older_nav_keeps_workbook_values(tmp_path):
+	dataset = scoring_dataset()
+	path = history_with_navs(tmp_path, {"KAY": [("2023-03-31", 21.0)]})
+	updated = with_history_updates(dataset, path)
+	pd.testing.assert_frame_equal(updated.frame, dataset.frame)
+
+# A NAV newer than the workbook's date of last results replaces that VCT's metrics and no other row
+def test_newer_nav_replaces_metrics(tmp_path):
+	dataset = scoring_dataset()
+	path = history_with_navs(tmp_path, {"KAY": [("2023-03-31", 21.0), ("2023-09-30", 21.5)]})
+	updated = with_history_updates(dataset, path).frame
+	kay = (dataset.frame["TIDM"] == "KAY").to_numpy()
+	assert updated.loc[kay, "Date of last results"].iloc[0] == pd.Timestamp("2023-09-30")
+	expected = load_history(path).metrics(["KAY"])
+	assert updated.loc[kay, "NAV tr 1 yr"].iloc[0] == expected["NAV tr 1 yr"][0]
+	pd.testing.assert_frame_equal(updated[~kay], dataset.frame[~kay])
+
+def nav_history():
+	dates = ["2022-06-30", "2022-09-30", "2022-12-31"]
+	return NavHistory({
+		"A": ([], [(pd.Timestamp(date), nav) for date, nav in zip(dates, [100.0, 110.0, 121.0])]),
+		# B's second NAV is off the quarter end the others use
+		"B": ([], [(pd.Timestamp(date), nav) for date, nav in zip(["2022-06-30", "2022-09-15", "2022-12-31"], [100.0, 90.0, 99.0])]),
+	})
+
+# Window boundaries on a date a VCT has no NAV on read the VCT's last NAV before it
+def test_windows_read_each_vcts_last_nav():
+	returns = nav_history().rolling_returns(3, 2)
+	np.testing.assert_allclose(returns, [[10.0, 10.0], [10.0, -10.0]])
+
+# A NAV added for one VCT does not move the default windows past the other VCTs' last NAVs
+def test_default_windows_end_on_a_date_every_vct_has_reached():
+	history = nav_history()
+	appended = history.append(navs={"A": [("2023-03-31", 133.1)]})
+	np.testing.assert_array_equal(appended.rolling_returns(3, 2), history.rolling_returns(3, 2))
+	np.testing.assert_array_equal(appended.total_return(6), history.total_return(6))
+	# Asked for explicitly, a window ending after a VCT's last NAV has no return for it
+	assert np.isnan(appended.total_return(3, "2023-03-31")[1])
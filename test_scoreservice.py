@@ -0,0 +1,76 @@
+#Load packages
+import asyncio
+import json
+import os
+import pytest
+from scoreservice import RequestError, ScoreService, canonical_request, score_request, scoring_dataset
+
+# Tests of the HTTP/JSON score service in scoreservice.py: python -m pytest test_scoreservice.py
+# The service reads the workbooks from the working directory, so each test runs in the repository directory
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture(autouse=True)
+def in_repository(monkeypatch):
+	monkeypatch.chdir(here)
+
+# Requests differing only in the order of their lists and weights have the same canonical form
+def test_equal_requests_have_one_canonical_form():
+	dataset = scoring_dataset()
+	first = canonical_request(dataset, {"columns": ["Discount", "NAV tr 1 yr"], "weights": {"Discount": 8, "Performance Score": 2},
+		"aic_sectors": ["VCT Generalist", "Other"]})
+	second = canonical_request(dataset, {"columns": ["NAV tr 1 yr", "Discount"], "weights": {"Performance Score": 2, "Discount": 8},
+		"aic_sectors": ["Other", "VCT Generalist", "Other"]})
+	assert first == second
+	assert first[2] == "Score"
+
+# A request with nothing scored is sorted by its first column, and bad fields are rejected with a 400
+def test_canonical_request_defaults_and_errors():
+	dataset = scoring_dataset()
+	assert canonical_request(dataset, {"columns": ["VCT"]})[2:4] == ("VCT", True)
+	for body in [{"columns": ["No such column"]}, {"sort_by": "Score", "columns": ["VCT"]}, {"top": 0}, {"colour": "red"}]:
+		with pytest.raises(RequestError) as error:
+			canonical_request(dataset, body)
+		assert error.value.status == 400
+
+# The top rows are the highest Scores in order, with the total counted before "top" is applied
+def test_score_request_returns_the_top_rows():
+	dataset = scoring_dataset()
+	columns = ["NAV tr 1 yr", "Discount", "Net Assets"]
+	everything = score_request(dataset, canonical_request(dataset, {"columns": columns}))
+	top = score_request(dataset, canonical_request(dataset, {"columns": columns, "top": 3}))
+	scores = [row[everything["columns"].index("Score")] for row in everything["rows"]]
+	assert scores == sorted(scores, reverse=True)
+	assert top["rows"] == everything["rows"][:3]
+	assert top["total"] == everything["total"] == len(dataset.frame)
+
+# Read one response from a connection as (status, headers, JSON body)
+async def read_response(reader):
+	head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+	headers = dict(line.lower().split(": ", 1) for line in head[1:] if line)
+	body = await reader.readexactly(int(headers["content-length"]))
+	return int(head[0].split(" ")[1]), headers, json.loads(body)
+
+# Two requests answered on one keep-alive connection, the second from the response cache
+def test_keep_alive_round_trip():
+	async def round_trip():
+		service = ScoreService(cache_size=4, workers=1)
+		server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+		async with server:
+			reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+			body = json.dumps({"columns": ["NAV tr 1 yr", "Discount"], "top": 2}).encode()
+			request = b"POST /score HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+			responses = []
+			for _ in range(2):
+				writer.write(request)
+				await writer.drain()
+				responses.append(await read_response(reader))
+			writer.close()
+			await writer.wait_closed()
+		return service, responses
+
+	service, responses = asyncio.run(round_trip())
+	(status, headers, first), (_, _, second) = responses
+	assert status == 200 and headers["connection"] == "keep-alive"
+	assert first == second and len(first["rows"]) == 2
+	assert service.cache.stats()["hits"] == 1
@@ -0,0 +1,55 @@
+#Load packages
+import json
+import logging
+import os
+import time
+import streamlit as st
+
+# Per-stage timing for the Streamlit applications
+# Set the environment variable VCT_TIMING=1 to log one JSON line per rerun and show a timings panel under the table:
+#   VCT_TIMING=1 streamlit run ScoringTool.py
+
+logger = logging.getLogger("vct.timing")
+
+# Whether timings are logged and shown
+def timing_enabled():
+	return os.environ.get("VCT_TIMING", "") not in ("", "0")
+
+# Times the stages of one rerun: call lap with a stage name at the end of each stage
+class StageTimer:
+	def __init__(self, app):
+		self.app = app
+		self.timings = {}
+		self._start = self._last = time.perf_counter()
+
+	# Record the time since the previous lap against a stage, adding to it if the stage has already been recorded
+	def lap(self, stage):
+		now = time.perf_counter()
+		self.timings[stage] = self.timings.get(stage, 0) + (now - self._last) * 1000
+		self._last = now
+
+	# Total time of the rerun so far in milliseconds
+	def total(self):
+		return (self._last - self._start) * 1000
+
+	# Log the timings as a single JSON line and show them in a debug panel, if timing is enabled
+	# caches maps names to caches (or anything else with a stats method, see vctdata.DerivedCache) whose counts are reported too
+	def report(self, caches=None):
+		if not timing_enabled():
+			return
+		if not logger.handlers and not logging.getLogger().handlers:
+			logger.addHandler(logging.StreamHandler())
+		logger.setLevel(logging.INFO)
+		cache_stats = {name: cache.stats() for name, cache in (caches or {}).items()}
+		logger.info(json.dumps({
+			"app": self.app,
+			"total_ms": round(self.total(), 3),
+			"stages_ms": {stage: round(ms, 3) for stage, ms in self.timings.items()},
+			"caches": cache_stats,
+		}))
+		with st.expander("Timings (ms)"):
+			st.table({"Stage": list(self.timings) + ["Total"],
+					  "Time (ms)": [round(ms, 2) for ms in self.timings.values()] + [round(self.total(), 2)]})
+			if cache_stats:
+				names = list(dict.fromkeys(stat for stats in cache_stats.values() for stat in stats))
+				st.table({"Cache": list(cache_stats), **{stat: [stats.get(stat, "") for stats in cache_stats.values()] for stat in names}})
@@ -0,0 +1,359 @@
+#Load packages
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from columnregistry import registry
+from scoring import ColumnStats
+from sheetstream import read_sheet_columns
+
+################ Define source workbook, sheets and column types - edit here if the source spreadsheet changes ####################
+
+DATABASE_FILE = "VCT Database.xlsm"
+SCORING_SHEET = "Streamlit"
+PERFORMANCE_SHEET = "Streamlit_Performance"
+
+# Compiled snapshots are written here, one Parquet file per sheet
+SNAPSHOT_DIR = "snapshots"
+
+# The scoring sheet with the manager workbooks merged over it, written to the snapshot directory by managerdata.py
+# and loaded in place of the sheet while the workbook and every manager workbook are unchanged
+MANAGER_SNAPSHOT = "Manager workbooks.parquet"
+
+# Workbooks this size or larger are read with the streaming reader, which holds a chunk of rows at a time
+STREAM_MIN_BYTES = 4 * 1024 * 1024
+
+# Column types are declared in columnregistry.py, any other column is numeric
+
+# Columns the applications filter by, indexed when a dataset is loaded
+index_columns = ["AIC Sector", "Management Group"]
+
+###################################################################################################################################
+
+# Loaded datasets are held once per process and shared by every Streamlit session
+_sheet_cache = {}
+_cache_lock = threading.Lock()
+
+# Key under which the source workbook details are stored in the snapshot metadata
+_SOURCE_METADATA_KEY = b"vct_source"
+
+# Key under which the sheet and the details of every source workbook are stored in the merged manager snapshot's metadata
+_SOURCES_METADATA_KEY = b"vct_sources"
+
+# Sources read from the metadata of each merged manager snapshot, by the snapshot's path, modification time and size
+_manager_snapshot_sources = {}
+
+# Build the cache key for a sheet from the workbook path and the workbook's current modification time and size
+def _cache_key(path, sheet_name):
+	stat = os.stat(path)
+	return (os.path.abspath(path), sheet_name, stat.st_mtime_ns, stat.st_size)
+
+# Path of the snapshot compiled from a given workbook sheet
+def snapshot_path(path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+	workbook = os.path.splitext(os.path.basename(path))[0]
+	return os.path.join(os.path.dirname(path), snapshot_dir, workbook, f"{sheet_name}.parquet")
+
+# Convert the columns of a freshly parsed sheet to their expected types, raising ValueError on unexpected values
+def apply_column_types(df, sheet_name=""):
+	df = df.copy()
+	for col in df.columns:
+		column_type = registry.type_of.get(col)
+		if column_type == "text":
+			continue
+		if column_type == "category":
+			df[col] = df[col].astype("category")
+		elif column_type == "date":
+			df[col] = pd.to_datetime(df[col])
+		else:
+			converted = pd.to_numeric(df[col], errors="coerce")
+			invalid = converted.isna() & df[col].notna()
+			if invalid.any():
+				raise ValueError(f"Sheet '{sheet_name}' column '{col}' has non-numeric values: "
+								 f"{', '.join(str(x) for x in df.loc[invalid, col].unique())}")
+			df[col] = converted
+	return df
+
+# Parse a sheet from the Excel workbook and apply the column types
+# Workbooks of STREAM_MIN_BYTES or more are streamed a chunk of rows at a time rather than parsed whole
+def read_workbook_sheet(path, sheet_name):
+	if os.path.getsize(path) >= STREAM_MIN_BYTES:
+		df = read_sheet_columns(path, sheet_name)
+	else:
+		df = pd.read_excel(path, sheet_name=sheet_name, engine="openpyxl")
+	return apply_column_types(df, sheet_name)
+
+# Parse a workbook sheet and write it as a Parquet snapshot tagged with the workbook's modification time and size
+def compile_snapshot(path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+	stat = os.stat(path)
+	df = read_workbook_sheet(path, sheet_name)
+	table = pa.Table.from_pandas(df, preserve_index=False)
+	source = {"sheet": sheet_name, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+	metadata = dict(table.schema.metadata or {})
+	metadata[_SOURCE_METADATA_KEY] = json.dumps(source).encode()
+	table = table.replace_schema_metadata(metadata)
+
+	output = snapshot_path(path, sheet_name, snapshot_dir)
+	os.makedirs(os.path.dirname(output), exist_ok=True)
+	pq.write_table(table, output)
+	return output
+
+# Read the snapshot for a workbook sheet, returning None if it is missing or older than the workbook
+def read_snapshot(path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+	snapshot = snapshot_path(path, sheet_name, snapshot_dir)
+	if not os.path.exists(snapshot):
+		return None
+	metadata = pq.read_schema(snapshot).metadata or {}
+	if _SOURCE_METADATA_KEY not in metadata:
+		return None
+	source = json.loads(metadata[_SOURCE_METADATA_KEY])
+	stat = os.stat(path)
+	if (source.get("sheet"), source.get("mtime_ns"), source.get("size")) != (sheet_name, stat.st_mtime_ns, stat.st_size):
+		return None
+	return pq.read_table(snapshot, memory_map=True).to_pandas()
+
+# Path of the merged manager snapshot of a workbook
+def manager_snapshot_path(path, snapshot_dir=SNAPSHOT_DIR):
+	return os.path.join(os.path.dirname(path), snapshot_dir, MANAGER_SNAPSHOT)
+
+# Metadata of a merged manager snapshot: the sheet it replaces and the modification time and size of every source workbook,
+# by the workbook's path relative to the snapshot
+def manager_snapshot_metadata(output, sheet_name, sources):
+	details = {os.path.relpath(source, os.path.dirname(output)): {"mtime_ns": os.stat(source).st_mtime_ns,
+		"size": os.stat(source).st_size} for source in sources}
+	return {_SOURCES_METADATA_KEY: json.dumps({"sheet": sheet_name, "sources": details}).encode()}
+
+# Modification time and size of the merged manager snapshot of a workbook sheet, None if it is missing, is for another sheet
+# or was not built from the workbook, or if any of its source workbooks has changed since
+# The snapshot's metadata is only read again when the snapshot itself changes
+def _manager_snapshot_state(path, sheet_name, snapshot_dir=SNAPSHOT_DIR):
+	snapshot = manager_snapshot_path(path, snapshot_dir)
+	if not os.path.exists(snapshot):
+		return None
+	stat = os.stat(snapshot)
+	key = (os.path.abspath(snapshot), stat.st_mtime_ns, stat.st_size)
+	if key not in _manager_snapshot_sources:
+		metadata = json.loads((pq.read_schema(snapshot).metadata or {}).get(_SOURCES_METADATA_KEY, b"{}"))
+		sources = {os.path.abspath(os.path.join(os.path.dirname(snapshot), source)): (details.get("mtime_ns"), details.get("size"))
+			for source, details in metadata.get("sources", {}).items()}
+		_manager_snapshot_sources[key] = (metadata.get("sheet"), sources)
+	sheet, sources = _manager_snapshot_sources[key]
+	if sheet != sheet_name or os.path.abspath(path) not in sources:
+		return None
+	for source, details in sources.items():
+		if not os.path.exists(source) or (os.stat(source).st_mtime_ns, os.stat(source).st_size) != details:
+			return None
+	return key[1:]
+
+# Index of a text or categorical column: the column's values as integer codes and the rows holding each value
+# The values, in order of first appearance, are the filter options and a filter is the union of the chosen values' rows,
+# so filtering never compares strings
+class CategoryIndex:
+	def __init__(self, values):
+		codes, categories = pd.factorize(values)
+		self.codes = codes
+		self.categories = list(categories)
+		order = np.argsort(codes, kind="stable")
+		bounds = np.searchsorted(codes[order], np.arange(len(self.categories) + 1))
+		self._rows = {category: order[bounds[i]:bounds[i + 1]] for i, category in enumerate(self.categories)}
+		self.codes.flags.writeable = False
+		for rows in self._rows.values():
+			rows.flags.writeable = False
+
+	def __len__(self):
+		return len(self.codes)
+
+	# Positions of the rows holding a value, in row order
+	def rows(self, category):
+		return self._rows.get(category, np.empty(0, dtype=np.intp))
+
+	# Boolean mask of the rows holding any of the chosen values
+	def mask(self, chosen):
+		mask = np.zeros(len(self), dtype=bool)
+		for category in chosen:
+			mask[self.rows(category)] = True
+		return mask
+
+# Approximate memory held by a cached result, counting the contents of frames and arrays and of the tuples holding them
+def result_bytes(result):
+	if isinstance(result, pd.DataFrame):
+		return int(result.memory_usage(index=True, deep=True).sum())
+	if isinstance(result, pd.Series):
+		return int(result.memory_usage(index=True, deep=True))
+	if isinstance(result, np.ndarray):
+		return result.nbytes
+	if isinstance(result, (tuple, list)):
+		return sys.getsizeof(result) + sum(result_bytes(item) for item in result)
+	return sys.getsizeof(result)
+
+# Bounded cache of results computed from shared data, the least recently used are dropped first
+# Bounded by the number of results and, if max_bytes is given, by the memory they hold (see result_bytes),
+# a single result larger than max_bytes is returned but not held
+# Counts the lookups that found a result (hits), had to compute one (misses) and the results dropped to stay in size (evictions)
+class DerivedCache:
+	def __init__(self, max_size, max_bytes=None):
+		self.max_size = max_size
+		self.max_bytes = max_bytes
+		self._results = OrderedDict()
+		self._sizes = {}
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self.hits = self.misses = self.evictions = 0
+
+	def __len__(self):
+		return len(self._results)
+
+	# Result held under a key, calling compute to get it if it is not held
+	def get(self, key, compute):
+		with self._lock:
+			if key in self._results:
+				self.hits += 1
+				self._results.move_to_end(key)
+				return self._results[key]
+			self.misses += 1
+		result = compute()
+		size = self._size(result)
+		with self._lock:
+			self._hold(key, result, size)
+		return result
+
+	# Result held under a key or default, without counting the lookup or marking the result as recently used
+	def peek(self, key, default=None):
+		with self._lock:
+			return self._results.get(key, default)
+
+	# Hold a result computed elsewhere, without counting a lookup, and return whether it is held
+	# A result that is not recent (computed ahead of any lookup) is held as the least recently used, and only if it fits
+	# without dropping another result, so it goes first unless a lookup asks for it
+	def put(self, key, result, recent=True):
+		size = self._size(result)
+		with self._lock:
+			if recent:
+				self._hold(key, result, size)
+				return key in self._results
+			if key in self._results:
+				return True
+			if len(self._results) >= self.max_size or (self.max_bytes is not None and self._bytes + size > self.max_bytes):
+				return False
+			self._hold(key, result, size)
+			self._results.move_to_end(key, last=False)
+			return True
+
+	# Number of results that can be added without dropping any
+	def free(self):
+		with self._lock:
+			return self.max_size - len(self._results)
+
+	# Size and lookup counts of the cache
+	def stats(self):
+		with self._lock:
+			stats = {"size": len(self._results), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+				"evictions": self.evictions}
+			if self.max_bytes is not None:
+				stats.update({"bytes": self._bytes, "max_bytes": self.max_bytes})
+			return stats
+
+	# Memory counted for a result, only measured when the cache is bounded by memory
+	def _size(self, result):
+		return result_bytes(result) if self.max_bytes is not None else 0
+
+	# Hold a result as the most recently used and drop the least recently used until the cache is back within its bounds
+	# Called with the lock held
+	def _hold(self, key, result, size):
+		if key in self._results:
+			del self._results[key]
+			self._bytes -= self._sizes.pop(key)
+		if self.max_bytes is not None and size > self.max_bytes:
+			return
+		self._results[key] = result
+		self._sizes[key] = size
+		self._bytes += size
+		while len(self._results) > self.max_size or (self.max_bytes is not None and self._bytes > self.max_bytes):
+			dropped, _ = self._results.popitem(last=False)
+			self._bytes -= self._sizes.pop(dropped)
+			self.evictions += 1
+
+# A loaded sheet together with the statistics precomputed from it
+# One Dataset is held per process and shared by every session, so the frame, statistics and derived results
+# must not be modified in place; sessions only keep their own selections and small per-row vectors
+# version identifies the workbook contents the dataset was loaded from
+class Dataset:
+	# Number of derived results kept, the least recently used are dropped first
+	max_derived = 64
+
+	def __init__(self, frame, sheet_name="", version=None):
+		# Rows are looked up by position, so the index must be the row positions
+		if not frame.index.equals(pd.RangeIndex(len(frame))):
+			frame = frame.reset_index(drop=True)
+		self.frame = frame
+		self.sheet_name = sheet_name
+		self.version = version
+		numeric_columns = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])]
+		self.stats = ColumnStats(frame[numeric_columns])
+		self.indexes = {col: CategoryIndex(frame[col]) for col in index_columns if col in frame.columns}
+		self._derived = DerivedCache(self.max_derived)
+
+	# Dataset with new values for some rows of some columns, leaving this one unchanged
+	# values maps each column to the new values of the given row positions; only the statistics of those columns
+	# are recomputed and the indexes of unchanged columns are reused
+	def with_values(self, rows, values, version=None):
+		frame = self.frame.copy(deep=False)
+		for col, new_values in values.items():
+			column = frame[col].copy()
+			column.iloc[rows] = new_values
+			frame[col] = column
+		dataset = object.__new__(Dataset)
+		dataset.frame, dataset.sheet_name, dataset.version = frame, self.sheet_name, version
+		numeric_changed = [col for col in values if col in self.stats]
+		dataset.stats = self.stats.with_columns(frame, numeric_changed) if numeric_changed else self.stats
+		dataset.indexes = {col: CategoryIndex(frame[col]) if col in values else index for col, index in self.indexes.items()}
+		dataset._derived = DerivedCache(self.max_derived)
+		return dataset
+
+	# Result derived from the dataset that every session can share, such as the sub-score table of a column selection
+	# compute is only called the first time a key is asked for, while the result is still held
+	def derived(self, key, compute):
+		return self._derived.get(key, compute)
+
+# Load a sheet as a Dataset, preferring an up to date merged manager snapshot, then an up to date snapshot of the sheet
+# and falling back to parsing the Excel workbook
+# Sheets are only reloaded, and their statistics recomputed, when the workbook or the merged snapshot has changed on disk
+def load_dataset(path, sheet_name):
+	manager_snapshot = _manager_snapshot_state(path, sheet_name)
+	key = _cache_key(path, sheet_name) + (() if manager_snapshot is None else manager_snapshot)
+	with _cache_lock:
+		dataset = _sheet_cache.get(key)
+		if dataset is None:
+			if manager_snapshot is not None:
+				df = pq.read_table(manager_snapshot_path(path), memory_map=True).to_pandas()
+			else:
+				df = read_snapshot(path, sheet_name)
+			if df is None:
+				df = read_workbook_sheet(path, sheet_name)
+			dataset = Dataset(df, sheet_name, version=key[2:])
+			# Forget any older versions of the same sheet
+			for old_key in [k for k in _sheet_cache if k[:2] == key[:2]]:
+				del _sheet_cache[old_key]
+			_sheet_cache[key] = dataset
+	return dataset
+
+# Empty the cache so that the next load re-reads every sheet
+def clear_cache():
+	with _cache_lock:
+		_sheet_cache.clear()
+
+# Compile the Streamlit sheets into snapshots: python vctdata.py [workbook] [--sheet NAME ...]
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compile workbook sheets into Parquet snapshots for the Streamlit applications.")
+	parser.add_argument("workbook", nargs="?", default=DATABASE_FILE, help="Excel workbook to compile")
+	parser.add_argument("--sheet", action="append", dest="sheets", help="Sheet to compile (may be repeated)")
+	parser.add_argument("--output-dir", default=SNAPSHOT_DIR, help="Snapshot directory, relative to the workbook")
+	args = parser.parse_args()
+
+	for sheet in args.sheets or [SCORING_SHEET, PERFORMANCE_SHEET]:
+		print(f"{sheet}: {compile_snapshot(args.workbook, sheet, args.output_dir)}")
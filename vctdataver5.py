@@ -1,9 +1,13 @@
 import pandas as pd
 import streamlit as st
 import math
+from timing import StageTimer
 
 # Main function for the Streamlit application
 def main():
+    # Time each stage of this rerun, see timing.py
+    timer = StageTimer("vctdataver5")
+
     # Set the title of the application
     st.title("VCT Database")
     st.subheader("Introduction")
@@ -15,6 +19,7 @@ def main():
     
     # Read the data from the specified Excel file and sheet using pandas
     df = pd.read_excel("Albion Valuation Manipulation.xlsm", sheet_name="Streamlit", engine="openpyxl")
+    timer.lap("load")
 
     # Define some column lists to manage the selection and display of data
     no_tickbox_columns = ["VCT"]
@@ -68,6 +73,7 @@ def main():
     tickboxes("Consistency", (no_of_operational + no_of_performance), no_of_consistency)
     tickboxes("Diversification", (no_of_operational + no_of_performance + no_of_consistency), no_of_diversification)
     tickboxes("Analytics", (no_of_operational + no_of_performance + no_of_consistency + no_of_diversification), no_of_analytics)
+    timer.lap("tickboxes")
 
     # Create a new DataFrame with the selected columns only
     filtered_df = df[selected_columns]
@@ -135,6 +141,8 @@ def main():
     
 	
 	
+    timer.lap("sub-scores")
+
     # Convert date columns to day-month-year format
     for col in date_columns:
         if col in filtered_df.columns:
@@ -216,6 +224,8 @@ def main():
         # Display the score
         filtered_df["Score"] = rounded_score
 
+    timer.lap("weighted score")
+
     # Determine the columns to consider for sorting based on the selected data
     if contains_similar_element(performance_columns, selected_columns):
         condition_columns = list(set(performance_columns) & set(selected_columns)) + score_columns + ["Score"]
@@ -240,6 +250,8 @@ def main():
             ascending = sort_order == "Ascending"
             filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
 
+    timer.lap("sort")
+
     # Reset the index to start from 1
     filtered_df.index = range(1, len(filtered_df) + 1)
 
@@ -247,13 +259,19 @@ def main():
     for col in condition_columns:
         filtered_df[col] = filtered_df[col].apply(lambda x: str(x).rstrip("0").rstrip(".") if isinstance(x, float) else x)
 
+    timer.lap("format")
+
     # Display the filtered DataFrame in a table format
     st.subheader("Table")
     st.write("View the table in full by selecting the arrows in the top right corner:")
     st.table(filtered_df)
+    timer.lap("render")
     
     with st.expander("Disclaimers"):
     	st.write(" ")
 
+    # Log the stage timings and show them in a debug panel when timing is enabled
+    timer.report()
+
 if __name__ == "__main__":
     main()